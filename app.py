@@ -2,9 +2,31 @@ import streamlit as st
 import firebase_admin
 from firebase_admin import credentials, firestore
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 import bcrypt
-import matplotlib.pyplot as plt
+import bisect
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
+from google.api_core import exceptions as api_exceptions
+from google.api_core.exceptions import AlreadyExists
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore as cloud_firestore
 # ---------------- PAGE CONFIG ----------------
 # ---------------- PAGE CONFIG ----------------
 st.set_page_config(
@@ -99,7 +121,20 @@ div[data-testid="stVerticalBlock"] > div:has(div.stContainer) {
 </style>
 """, unsafe_allow_html=True)
 # ---------------- FIREBASE INIT ----------------
-if not firebase_admin._apps:
+EMULATOR_HOST = os.environ.get("FIRESTORE_EMULATOR_HOST")
+
+
+@st.cache_resource
+def get_firestore_client():
+    # One client (and gRPC channel) per process, shared by every chapter and session
+    if EMULATOR_HOST:
+        # Local Firestore emulator (development, loadtest.py): no service account needed
+        return cloud_firestore.Client(
+            project=os.environ.get("GOOGLE_CLOUD_PROJECT", "volunteers-local"),
+            credentials=AnonymousCredentials()
+        )
+    if firebase_admin._apps:
+        return firestore.client()
     cred = credentials.Certificate({
         "type": st.secrets["firebase"]["type"],
         "project_id": st.secrets["firebase"]["project_id"],
@@ -114,8 +149,81 @@ if not firebase_admin._apps:
         "universe_domain": st.secrets["firebase"]["universe_domain"],
     })
     firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+# ---------------- TENANCY ----------------
+# One process serves several chapters. A chapter's collections (users, notices,
+# funds, meetings, teams, ...) live under chapters/<id>/; the default chapter
+# keeps the root collections, so single-chapter deployments are unchanged.
+# Chapters are listed in [tenants] chapters = [...] (or TENANTS=a,b) and picked
+# with ?chapter=<id> or the subdomain (pune.portal.example.org -> pune).
+
+TENANT_ROOT = "chapters"
+DEFAULT_TENANT = "default"
 
-db = firestore.client()
+
+class TenantClient:
+    # collection() is scoped to the chapter; batch(), transaction() etc. go to the shared client
+    def __init__(self, client, tenant):
+        self._client = client
+        self._root = client if tenant == DEFAULT_TENANT else client.collection(TENANT_ROOT).document(tenant)
+
+    def collection(self, name):
+        return self._root.collection(name)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def configured_tenants():
+    try:
+        chapters = list(st.secrets.get("tenants", {}).get("chapters", []))
+    except Exception:
+        chapters = []
+    chapters += [c.strip() for c in os.environ.get("TENANTS", "").split(",") if c.strip()]
+    return set(chapters)
+
+
+def resolve_tenant():
+    chapters = configured_tenants()
+    requested = st.query_params.get("chapter")
+    if not requested:
+        try:
+            host = st.context.headers.get("Host", "")
+        except AttributeError:
+            host = ""
+        subdomain = host.split(":")[0].split(".")[0]
+        requested = subdomain if subdomain in chapters else DEFAULT_TENANT
+    if requested != DEFAULT_TENANT and requested not in chapters:
+        st.error(f"Unknown chapter: {requested}")
+        st.stop()
+    return requested
+
+
+def tenant_key(cache_key):
+    # Process-wide caches are shared by all chapters, so keys carry the chapter
+    return None if cache_key is None else f"{tenant}:{cache_key}"
+
+
+tenant = resolve_tenant()
+db = TenantClient(get_firestore_client(), tenant)
+
+# ---------------- FIELD PROJECTIONS ----------------
+# List queries fetch only the fields their view uses (Firestore select()).
+# Paged queries must include their order_by field so cursors can be built.
+NOTICE_FIELDS = ["notice", "name_father", "posted_at", "is_pinned", "likes", "recent_likers", "trend_score"]
+FUNDS_RECEIVED_FIELDS = ["date_time", "source", "amount", "mode", "transaction_details"]
+FUNDS_SPENT_FIELDS = ["date_time", "purpose", "payee", "amount"]
+ATTENDANCE_FIELDS = ["name", "user_id", "attending", "reason", "submitted_at"]
+VOTE_FIELDS = ["agenda", "date", "time", "place"]
+VOTE_TABLE_FIELDS = ["name_father", "user_id", "voted_at"] + VOTE_FIELDS
+TEAM_RECORD_FIELDS = ["name", "details", "created_at"]
+COMPLAINT_FIELDS = ["complaint", "created_by", "created_name", "likes", "is_published", "recent_likers", "trend_score"]
+SUGGESTION_FIELDS = ["suggestion", "created_by", "created_name", "likes", "recent_likers", "trend_score"]
+LIKER_FIELDS = ["name", "liked_at"]
+REQUEST_FIELDS = ["name", "father_name", "mobile"]
+HISTORY_FIELDS = ["meeting_id", "created_at", "status", "attendance_count", "vote_count"]
+MEMBER_STATS_FIELDS = ["name", "meetings_attended", "meetings_declined", "meetings_voted", "last_seen"]
 
 # ---------------- AUTH FUNCTIONS ----------------
 
@@ -133,8 +241,11 @@ def check_password(password, hashed):
         return False
 def get_user_by_mobile(mobile):
     # We added .limit(1) so it stops searching immediately after finding the user!
-    users = db.collection("users").where("mobile", "==", mobile).limit(1).stream()
-    
+    users = guarded(
+        "user_lookup",
+        lambda: list(db.collection("users").where("mobile", "==", mobile).limit(1).stream(**rpc()))
+    )
+
     for user in users:
         data = user.to_dict()
         data["id"] = user.id
@@ -142,6 +253,1962 @@ def get_user_by_mobile(mobile):
         
     return None
 
+# ---------------- CHART CACHE ----------------
+
+CHART_CACHE_SIZE = 128
+
+
+class LRUCache:
+    # Small thread-safe LRU shared by every session of this process
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+
+@st.cache_resource
+def get_chart_cache():
+    return LRUCache(CHART_CACHE_SIZE)
+
+
+def chart_key(data_dict, title):
+    # Same tally + same title -> same key, no matter the insertion order
+    payload = json.dumps(
+        {"title": title, "data": sorted((str(k), v) for k, v in data_dict.items())}
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def render_pie_png(data_dict, title):
+    # A bare Figure on the Agg canvas: no pyplot global state, so the warm-up
+    # thread and script threads can render at the same time
+    fig = Figure(figsize=(3,3))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.pie(
+        data_dict.values(),
+        labels=data_dict.keys(),
+        autopct="%1.1f%%",
+        startangle=90
+    )
+    ax.set_title(title)
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    return buf.getvalue()
+
+
+def draw_pie(data_dict, title):
+    # Prevent crashes if a dictionary is somehow empty
+    if not data_dict:
+        st.info(f"No data for {title}")
+        return
+
+    cache = get_chart_cache()
+    key = chart_key(data_dict, title)
+    png = cache.get(key)
+
+    if png is None:
+        png = render_pie_png(data_dict, title)
+        cache.put(key, png)
+
+    st.image(png, use_container_width=True)
+
+# ---------------- FIRESTORE CALL POLICY ----------------
+# Every guarded call gets a deadline, jittered exponential retries for
+# transient errors and a shared circuit breaker. While the breaker is open,
+# calls fail fast and serve the last good result for their cache key, if any;
+# once the reset period has passed, a single trial call decides whether it closes.
+# Calls pass **rpc(kind) so the client's own deadline and retries match the policy.
+
+# "maintenance" is for full scans (backfills, rebuilds, index seeds) that
+# legitimately outlive an interactive read's deadline
+CALL_DEADLINES = {"read": 10.0, "write": 15.0, "maintenance": 120.0}  # seconds per attempt
+CALL_MAX_ATTEMPTS = {"read": 3, "write": 1, "maintenance": 2}  # writes are not always idempotent
+CALL_BACKOFF = 0.2  # seconds, doubled per retry
+BREAKER_FAILURE_THRESHOLD = 5  # consecutive failed calls before opening
+BREAKER_RESET_SECONDS = 30  # open time before a trial call is let through
+RETRYABLE_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    api_exceptions.TooManyRequests,
+    api_exceptions.Aborted,
+)
+
+
+class BackendUnavailable(Exception):
+    pass
+
+
+def rpc(kind="read"):
+    # Keyword arguments for the Firestore call itself: the client cancels the RPC
+    # at the same deadline and leaves retrying to CallPolicy, so a write is never
+    # re-sent behind its back
+    return {"timeout": CALL_DEADLINES[kind], "retry": None}
+
+
+class CallPolicy:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Deadline enforcement runs calls here, apart from the read pool,
+        # so a guarded read inside fetch_concurrently can't starve itself
+        self._pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="firestore-call")
+        self.stale = LRUCache(256)
+        self.counters = {
+            "calls": 0, "failures": 0, "retries": 0, "timeouts": 0,
+            "short_circuited": 0, "stale_served": 0, "breaker_opened": 0
+        }
+        self.latencies = {}
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _record_latency(self, op, seconds):
+        with self._lock:
+            self.latencies.setdefault(op, deque(maxlen=500)).append(seconds)
+
+    def breaker_state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.time() - self.opened_at >= BREAKER_RESET_SECONDS:
+                return "half-open"
+            return "open"
+
+    def _admit(self):
+        # None: short-circuit; True: this call is the single half-open trial
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            if self._probing or time.time() - self.opened_at < BREAKER_RESET_SECONDS:
+                return None
+            self._probing = True
+            return True
+
+    def _on_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+
+    def _on_failure(self):
+        with self._lock:
+            self.counters["failures"] += 1
+            self.consecutive_failures += 1
+            # A failed half-open trial re-opens the breaker for another period
+            if self.opened_at is not None or self.consecutive_failures >= BREAKER_FAILURE_THRESHOLD:
+                if self.opened_at is None:
+                    self.counters["breaker_opened"] += 1
+                self.opened_at = time.time()
+
+    def _fallback(self, op, cache_key, error):
+        if cache_key is not None:
+            cached = self.stale.get(cache_key)
+            if cached is not None:
+                self._count("stale_served")
+                return cached[0]
+        raise BackendUnavailable(f"The database is not responding right now ({op}). Please try again shortly.") from error
+
+    def call(self, op, fn, kind="read", cache_key=None):
+        self._count("calls")
+
+        probe = self._admit()
+        if probe is None:
+            self._count("short_circuited")
+            return self._fallback(op, cache_key, None)
+        try:
+            return self._attempt(op, fn, kind, cache_key)
+        finally:
+            if probe:
+                with self._lock:
+                    self._probing = False
+
+    def _attempt(self, op, fn, kind, cache_key):
+        # fn should pass **rpc(kind) to its Firestore call so a timed-out RPC is cancelled
+        error = None
+        for attempt in range(CALL_MAX_ATTEMPTS[kind]):
+            started = time.perf_counter()
+            try:
+                result = self._pool.submit(fn).result(timeout=CALL_DEADLINES[kind])
+            except FutureTimeout as e:
+                self._count("timeouts")
+                error = e
+            except RETRYABLE_ERRORS as e:
+                error = e
+            else:
+                self._record_latency(op, time.perf_counter() - started)
+                self._on_success()
+                if cache_key is not None:
+                    # Wrapped so falsy results (empty lists) are cached too
+                    self.stale.put(cache_key, (result,))
+                return result
+
+            if attempt + 1 < CALL_MAX_ATTEMPTS[kind]:
+                self._count("retries")
+                time.sleep(CALL_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+        self._on_failure()
+        return self._fallback(op, cache_key, error)
+
+    def percentiles(self):
+        with self._lock:
+            samples = {op: sorted(values) for op, values in self.latencies.items()}
+        rows = []
+        for op, values in sorted(samples.items()):
+            pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+            rows.append({
+                "Operation": op,
+                "Calls": len(values),
+                "p50 (ms)": round(pick(0.50) * 1000, 1),
+                "p95 (ms)": round(pick(0.95) * 1000, 1),
+                "p99 (ms)": round(pick(0.99) * 1000, 1),
+            })
+        return rows
+
+
+@st.cache_resource
+def get_call_policy():
+    return CallPolicy()
+
+
+def guarded(op, fn, kind="read", cache_key=None, budgeted=True):
+    # Non-retryable errors (NotFound, AlreadyExists, ...) propagate unchanged.
+    # budgeted=False is for reads a write depends on; "write" and "maintenance"
+    # calls are never budgeted
+    budgeted = budgeted and kind == "read"
+    if budgeted and budget.exhausted():
+        return over_budget(op, tenant_key(cache_key))
+    result = get_call_policy().call(op, fn, kind, tenant_key(cache_key))
+    if budgeted:
+        budget.charge(result)
+    return result
+
+# ---------------- READ BUDGETS ----------------
+# Every page run may read at most N documents through guarded() and
+# fetch_concurrently(). Past that, reads serve their last good copy if there is
+# one and otherwise raise BudgetExceeded, which pages already handle as
+# BackendUnavailable. Unbounded lists are capped to what is left (see cap()).
+# Reads that a write depends on (meeting snapshots) pass budgeted=False and are
+# never cut short; maintenance scans use kind="maintenance", which is unbudgeted.
+# Override per page with [read_budgets] "Reports" = 500.
+
+PAGE_READ_BUDGETS = {
+    "Public Notice Board": 300,
+    "Reports": 300,
+    "Dashboard": 500,
+    "Teams": 200,
+    "Meetings": 300,
+    "Plan Next Meeting": 100,
+    "Fund Mngmnt": 2000,
+    "Admin Panel": 2000,
+}
+DEFAULT_READ_BUDGET = 500
+
+logger = logging.getLogger("volunteer_portal")
+
+
+class BudgetExceeded(BackendUnavailable):
+    pass
+
+
+class ReadBudget:
+    def __init__(self, page, limit):
+        self.page = page
+        self.limit = limit  # None: unlimited
+        self.used = 0
+        self.degraded = False
+
+    def exhausted(self):
+        return self.limit is not None and self.used >= self.limit
+
+    def remaining(self):
+        return None if self.limit is None else max(0, self.limit - self.used)
+
+    def charge(self, result):
+        # Lists of snapshots cost one read each, and a query that matches nothing
+        # is still billed one; a single document get costs one
+        if isinstance(result, list):
+            self.used += max(1, len(result))
+        elif hasattr(result, "exists"):
+            self.used += 1
+        elif hasattr(result, "take_reads"):
+            # Process-wide caches bill the run that actually scanned the collection
+            self.used += result.take_reads()
+
+    def share(self, parts=1, reserve=0):
+        # One of `parts` equal slices of what is left, or None when unlimited
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        return max(1, (remaining - reserve) // parts)
+
+    def cap(self, query, parts=1, reserve=0):
+        # Limits an otherwise unbounded query to its share of what is left
+        size = self.share(parts, reserve)
+        if size is None:
+            return query, None
+        return query.limit(size), size
+
+
+def page_read_budget(page):
+    try:
+        overrides = dict(st.secrets.get("read_budgets", {}))
+    except Exception:
+        overrides = {}
+    return overrides.get(page, PAGE_READ_BUDGETS.get(page, DEFAULT_READ_BUDGET))
+
+
+# Shares of the page budget given to the capped list reads; the cache warm-up
+# reads the same lists with the same shares (see fresh_share)
+NOTICE_LIST_SHARE = {"parts": 2}  # each notice also costs a like check
+FUND_LIST_SHARE = {"parts": 2, "reserve": 2}  # two tables, plus the two totals
+
+
+def fresh_share(page, parts=1, reserve=0):
+    # What budget.share() gives on a run of page that has not read anything yet
+    return ReadBudget(page, page_read_budget(page)).share(parts, reserve)
+
+
+@st.cache_resource
+def get_budget_log():
+    return deque(maxlen=100)
+
+
+def page_call_site():
+    # Line of page code (module level of this script) that led to the read
+    frame = sys._getframe()
+    while frame is not None and not (frame.f_code.co_name == "<module>" and frame.f_code.co_filename == __file__):
+        frame = frame.f_back
+    return frame.f_lineno if frame is not None else None
+
+
+def over_budget(op, cache_key):
+    cached = get_call_policy().stale.get(cache_key) if cache_key is not None else None
+    line = page_call_site()
+    logger.warning(
+        "Read budget exceeded: chapter=%s page=%r op=%s line=%s used=%s limit=%s",
+        tenant, budget.page, op, line, budget.used, budget.limit
+    )
+    get_budget_log().append({
+        "Time": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        "Chapter": tenant,
+        "Page": budget.page,
+        "Operation": op,
+        "Line": line,
+        "Used / Limit": f"{budget.used} / {budget.limit}",
+        "Served": "cached copy" if cached is not None else "skipped",
+    })
+    if not budget.degraded:
+        budget.degraded = True
+        st.toast("This page reached its read limit, so some sections show cached or reduced data.", icon="⚠️")
+    if cached is not None:
+        return cached[0]
+    raise BudgetExceeded(f"Skipped to keep this page within its read budget ({op}).")
+
+
+budget = ReadBudget(None, None)
+
+# ---------------- CONCURRENT READS ----------------
+
+READ_POOL_WORKERS = 8
+
+
+@st.cache_resource
+def get_read_pool():
+    # The Firestore client is thread-safe, so one pool serves every session
+    return ThreadPoolExecutor(max_workers=READ_POOL_WORKERS, thread_name_prefix="firestore-read")
+
+
+def fetch_concurrently(budgeted=True, kind="read", **reads):
+    # Each value is a zero-argument callable doing Firestore I/O only (no st.* calls,
+    # they must stay on the script thread), or a (callable, cache_key) pair to keep a
+    # stale copy for outages. Results come back under the same names.
+    # budgeted and kind are as for guarded()
+    pool = get_read_pool()
+    policy = get_call_policy()
+    futures = {}
+    results = {}
+    for name, read in reads.items():
+        read, cache_key = read if isinstance(read, tuple) else (read, None)
+        if budgeted and budget.exhausted():
+            results[name] = over_budget(name, tenant_key(cache_key))
+        else:
+            futures[name] = pool.submit(policy.call, name, read, kind, tenant_key(cache_key))
+    for name, future in futures.items():
+        results[name] = future.result()
+        if budgeted:
+            budget.charge(results[name])
+    return {name: results[name] for name in reads}
+
+# ---------------- LOCAL READ REPLICA ----------------
+# Optional SQLite copy of the read-heavy collections, kept current by Firestore
+# snapshot listeners. Enable with a [replica] path = "..." secret (or the
+# REPLICA_PATH environment variable). Writes always go to Firestore.
+# A collection is only served from the replica while its listener is running
+# without errors and was heard from within [replica] max_lag_seconds (or
+# REPLICA_MAX_LAG); otherwise pages read Firestore as usual.
+
+REPLICA_COLLECTIONS = {
+    # collection: fields that get an expression index for filtering / ordering
+    "notices": ["posted_at", "trend_score"],
+    "funds_received": ["date_time"],
+    "funds_spent": ["date_time"],
+    "complaints": ["likes", "trend_score", "is_published"],
+    "suggestions": ["likes", "trend_score"],
+    "meeting_details": ["meeting_id"],
+    "admin_settings": [],
+}
+DEFAULT_REPLICA_MAX_LAG = 300  # seconds
+REPLICA_TIMESTAMP_FIELDS = {"posted_at", "date_time", "created_at", "voted_at", "submitted_at", "closed_at"}
+
+
+def _replica_default(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat()
+    return str(value)
+
+
+def _replica_load(doc_id, raw):
+    data = json.loads(raw)
+    for field in REPLICA_TIMESTAMP_FIELDS:
+        value = data.get(field)
+        # Legacy "%Y-%m-%d %H:%M" strings have no "T" and stay strings
+        if isinstance(value, str) and "T" in value:
+            try:
+                data[field] = datetime.fromisoformat(value)
+            except ValueError:
+                pass
+    data["doc_id"] = doc_id
+    return data
+
+
+class LocalReplica:
+    def __init__(self, path, store, max_lag=DEFAULT_REPLICA_MAX_LAG):
+        self._store = store
+        self.max_lag = max_lag
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "collection TEXT NOT NULL, doc_id TEXT NOT NULL, data TEXT NOT NULL, "
+            "PRIMARY KEY (collection, doc_id))"
+        )
+        for fields in REPLICA_COLLECTIONS.values():
+            for field in fields:
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_docs_{field} "
+                    f"ON docs (collection, json_extract(data, '$.{field}'))"
+                )
+        self._conn.commit()
+        # Freshness watermark: read_time of the last snapshot applied per collection
+        self.watermarks = {}
+        self.errors = {}
+        # When each listener last showed it was current (wall clock)
+        self.heard_at = {}
+        self._tokens = {}
+        self._watches = {}
+
+    def start(self):
+        for collection in REPLICA_COLLECTIONS:
+            self._watches[collection] = self._store.collection(collection).on_snapshot(self._listener(collection))
+
+    def _listener(self, collection):
+        def on_snapshot(_docs, changes, read_time):
+            try:
+                with self._lock:
+                    if collection not in self.watermarks:
+                        # First snapshot is the full collection: start from a clean slate
+                        self._conn.execute("DELETE FROM docs WHERE collection = ?", (collection,))
+                    for change in changes:
+                        doc = change.document
+                        if change.type.name == "REMOVED":
+                            self._conn.execute(
+                                "DELETE FROM docs WHERE collection = ? AND doc_id = ?",
+                                (collection, doc.id)
+                            )
+                        else:
+                            self._conn.execute(
+                                "INSERT OR REPLACE INTO docs (collection, doc_id, data) VALUES (?, ?, ?)",
+                                (collection, doc.id, json.dumps(doc.to_dict(), default=_replica_default))
+                            )
+                    self._conn.commit()
+                    self.watermarks[collection] = read_time
+                    self.heard_at[collection] = time.time()
+                    self.errors.pop(collection, None)
+            except Exception as e:
+                self.errors[collection] = str(e)
+        return on_snapshot
+
+    def is_ready(self, collection):
+        return collection in self.watermarks
+
+    def lag(self, collection):
+        # Seconds since the listener was last known to be current, None if never.
+        # Snapshots only arrive with changes, so an idle collection's watermark
+        # ages; the server's heartbeats still move the stream's resume token on
+        with self._lock:
+            watch = self._watches.get(collection)
+            token = getattr(watch, "resume_token", None)
+            if token is not None and token != self._tokens.get(collection) and collection in self.heard_at:
+                self._tokens[collection] = token
+                self.heard_at[collection] = time.time()
+            heard_at = self.heard_at.get(collection)
+        return None if heard_at is None else time.time() - heard_at
+
+    def is_fresh(self, collection):
+        watch = self._watches.get(collection)
+        if not self.is_ready(collection) or collection in self.errors or watch is None or not watch.is_active:
+            return False
+        lag = self.lag(collection)
+        return lag is not None and lag <= self.max_lag
+
+    def read(self, collection, where=None, order_by=None, descending=True, limit=None, after=None):
+        # after: (sort value, doc_id) of the last row already shown, for keyset paging
+        sql = "SELECT doc_id, data FROM docs WHERE collection = ?"
+        params = [collection]
+        for field, value in (where or {}).items():
+            sql += f" AND json_extract(data, '$.{field}') = ?"
+            params.append(value)
+        if order_by:
+            key = f"json_extract(data, '$.{order_by}')"
+            direction, op = ("DESC", "<") if descending else ("ASC", ">")
+            if after is not None:
+                value, doc_id = after
+                # SQLite sorts NULL (a missing field) below every value
+                if value is None:
+                    sql += f" AND (({key} IS NULL AND doc_id {op} ?){'' if descending else f' OR {key} IS NOT NULL'})"
+                    params.append(doc_id)
+                else:
+                    sql += f" AND ({key} {op} ? OR ({key} = ? AND doc_id {op} ?){f' OR {key} IS NULL' if descending else ''})"
+                    params += [value, value, doc_id]
+            sql += f" ORDER BY {key} {direction}, doc_id {direction}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_replica_load(doc_id, raw) for doc_id, raw in rows]
+
+
+def replica_path(tenant):
+    try:
+        path = st.secrets.get("replica", {}).get("path")
+    except Exception:
+        path = None
+    path = path or os.environ.get("REPLICA_PATH")
+    if path and tenant != DEFAULT_TENANT:
+        base, ext = os.path.splitext(path)
+        path = f"{base}-{tenant}{ext}"
+    return path
+
+
+def replica_max_lag():
+    try:
+        max_lag = st.secrets.get("replica", {}).get("max_lag_seconds")
+    except Exception:
+        max_lag = None
+    return float(max_lag or os.environ.get("REPLICA_MAX_LAG") or DEFAULT_REPLICA_MAX_LAG)
+
+
+@st.cache_resource
+def get_replica(tenant):
+    path = replica_path(tenant)
+    if not path:
+        return None
+    replica = LocalReplica(path, db, replica_max_lag())
+    replica.start()
+    return replica
+
+
+def replica_rows(collection, where=None, order_by=None, descending=True, limit=None):
+    # None means "not available, read Firestore instead"
+    replica = get_replica(tenant)
+    if replica is None or not replica.is_fresh(collection):
+        return None
+    return replica.read(collection, where, order_by, descending, limit)
+
+
+def render_replica_badge(collection):
+    replica = get_replica(tenant)
+    lag = replica.lag(collection) if replica else None
+    if lag is not None:
+        st.caption(f"⚡ Served from local replica, current as of {format_ts(datetime.utcnow() - timedelta(seconds=lag))}")
+
+# ---------------- WRITE-BEHIND QUEUE ----------------
+# Optional: low-priority writes (likes, team log entries, notice posts) are
+# queued and flushed by a background worker in WriteBatch groups, while the
+# session shows them optimistically. Enable with [write_behind] enabled = true
+# (or WRITE_BEHIND=1). Fund entries and auth changes always write synchronously.
+
+WRITE_BEHIND_FLUSH_INTERVAL = 1.0  # seconds to gather writes before a flush
+WRITE_BEHIND_MAX_RETRIES = 5
+WRITE_BEHIND_BACKOFF = 0.5  # seconds, doubled per retry
+
+
+def commit_writes(ops, policy=None):
+    # ops: (method, document_ref, data, kwargs) tuples, committed together.
+    # Background threads pass the policy in instead of touching st.cache_resource.
+    batch = db.batch()
+    for method, ref, data, kwargs in ops:
+        getattr(batch, method)(ref, data, **kwargs)
+    (policy or get_call_policy()).call("commit", lambda: batch.commit(**rpc("write")), kind="write")
+
+
+class WriteBehindQueue:
+    def __init__(self, policy):
+        self._policy = policy
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending_ids = set()
+        self._pending_creates = {}
+        self._next_id = 0
+        self.flushed = 0
+        self.retries = 0
+        self.duplicates = 0
+        self.failed = deque(maxlen=100)
+        threading.Thread(target=self._run, name="write-behind", daemon=True).start()
+
+    def enqueue(self, ops):
+        creates = [ref.path for method, ref, _, _ in ops if method == "create"]
+        with self._lock:
+            # A replayed submit of a create that is still queued is the same write
+            for path in creates:
+                if path in self._pending_creates:
+                    self.duplicates += 1
+                    return self._pending_creates[path]
+            self._next_id += 1
+            op_id = self._next_id
+            self._pending_ids.add(op_id)
+            for path in creates:
+                self._pending_creates[path] = op_id
+        self._queue.put((op_id, ops))
+        return op_id
+
+    def is_pending(self, op_id):
+        with self._lock:
+            return op_id in self._pending_ids
+
+    def _run(self):
+        while True:
+            groups = [self._queue.get()]
+            time.sleep(WRITE_BEHIND_FLUSH_INTERVAL)
+
+            # A group (e.g. like + counter update) is never split across batches
+            size = len(groups[0][1])
+            while not self._queue.empty() and size < BATCH_LIMIT:
+                group = self._queue.get()
+                groups.append(group)
+                size += len(group[1])
+
+            self._flush(groups)
+
+    def _flush(self, groups):
+        ops = [op for _, group_ops in groups for op in group_ops]
+        error = None
+
+        for attempt in range(WRITE_BEHIND_MAX_RETRIES):
+            try:
+                commit_writes(ops, self._policy)
+                error = None
+                break
+            except AlreadyExists:
+                # One group's create already landed earlier; the batch was rejected
+                # as a whole, so commit the groups one by one and drop that group
+                if len(groups) > 1:
+                    for group in groups:
+                        self._flush([group])
+                    return
+                with self._lock:
+                    self.duplicates += 1
+                self._finish(groups)
+                return
+            except Exception as e:
+                error = e
+                self.retries += 1
+                time.sleep(WRITE_BEHIND_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+        with self._lock:
+            if error is None:
+                self.flushed += len(groups)
+            else:
+                self.failed.extend((op_id, str(error)) for op_id, _ in groups)
+        self._finish(groups)
+
+    def _finish(self, groups):
+        with self._lock:
+            for op_id, ops in groups:
+                self._pending_ids.discard(op_id)
+                for method, ref, _, _ in ops:
+                    if method == "create":
+                        self._pending_creates.pop(ref.path, None)
+
+
+def write_behind_enabled():
+    try:
+        enabled = st.secrets.get("write_behind", {}).get("enabled", False)
+    except Exception:
+        enabled = False
+    return bool(enabled) or os.environ.get("WRITE_BEHIND") == "1"
+
+
+@st.cache_resource
+def get_write_behind():
+    return WriteBehindQueue(get_call_policy()) if write_behind_enabled() else None
+
+
+def submit_write(ops, overlay_kind=None, overlay=None):
+    # Synchronous unless write-behind is on; the overlay is what this session
+    # shows until the queued write has been flushed
+    write_behind = get_write_behind()
+    if write_behind is None:
+        try:
+            commit_writes(ops)
+        except AlreadyExists:
+            pass  # a replayed form submit: its create already landed
+        return
+
+    op_id = write_behind.enqueue(ops)
+    pending = st.session_state.setdefault("pending_writes", [])
+    if overlay_kind and all(e["op_id"] != op_id for e in pending):
+        pending.append({"kind": overlay_kind, "op_id": op_id, "payload": overlay})
+
+
+def pending_overlay(kind):
+    write_behind = get_write_behind()
+    entries = [
+        e for e in st.session_state.get("pending_writes", [])
+        if write_behind is not None and write_behind.is_pending(e["op_id"])
+    ]
+    st.session_state["pending_writes"] = entries
+    return [e["payload"] for e in entries if e["kind"] == kind]
+
+# ---------------- FORM TOKENS ----------------
+# Each rendered form carries a token that becomes the new document's ID and is
+# written with create(). A double-click or an interrupted rerun submits the same
+# token again and hits AlreadyExists instead of inserting a duplicate.
+
+def form_token(form_name):
+    key = f"form_token_{form_name}"
+    if key not in st.session_state:
+        st.session_state[key] = uuid.uuid4().hex
+    return st.session_state[key]
+
+
+def consume_form_token(form_name):
+    # The next render of the form gets a fresh token
+    st.session_state.pop(f"form_token_{form_name}", None)
+
+
+def create_once(ref, data):
+    # False when the document already exists, i.e. this submit was a replay
+    try:
+        guarded("create", lambda: ref.create(data, **rpc("write")), kind="write")
+    except AlreadyExists:
+        return False
+    return True
+
+# ---------------- PAGINATION ----------------
+
+PAGE_SIZE = 20
+
+
+def paged_query(query, state_key, page_size=PAGE_SIZE):
+    # Cursor stack lives in session state: one last-document snapshot per visited page
+    cursors = st.session_state.setdefault(f"{state_key}_cursors", [None])
+    if cursors[-1] is not None:
+        query = query.start_after(cursors[-1])
+    # One extra document tells us whether a next page exists
+    return query.limit(page_size + 1)
+
+
+def reset_pager(state_key):
+    st.session_state[f"{state_key}_cursors"] = [None]
+
+
+def stream_page(query, state_key, op, page_size=PAGE_SIZE):
+    # One guarded page read; the last good copy of each page is kept for outages
+    page = len(st.session_state.get(f"{state_key}_cursors", [None]))
+    page_query = paged_query(query, state_key, page_size)
+    return guarded(op, lambda: list(page_query.stream(**rpc())), cache_key=f"{state_key}:{page}")
+
+
+def render_pager(state_key, docs, page_size=PAGE_SIZE, cursor=None):
+    # cursor(last_doc) -> what the next page starts after (default: the snapshot itself)
+    cursors = st.session_state.setdefault(f"{state_key}_cursors", [None])
+    has_next = len(docs) > page_size
+    docs = docs[:page_size]
+
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+
+    with prev_col:
+        if len(cursors) > 1 and st.button("⬅ Previous", key=f"{state_key}_prev"):
+            cursors.pop()
+            st.rerun()
+
+    page_col.caption(f"Page {len(cursors)}")
+
+    with next_col:
+        if has_next and st.button("Next ➡", key=f"{state_key}_next"):
+            cursors.append(cursor(docs[-1]) if cursor else docs[-1])
+            st.rerun()
+
+    return docs
+
+
+def render_list_pager(state_key, items, page_size=PAGE_SIZE):
+    # Same controls as render_pager, for lists that are already in memory
+    page_count = max(1, -(-len(items) // page_size))
+    page = min(st.session_state.get(f"{state_key}_page", 0), page_count - 1)
+
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+
+    with prev_col:
+        if page > 0 and st.button("⬅ Previous", key=f"{state_key}_prev"):
+            st.session_state[f"{state_key}_page"] = page - 1
+            st.rerun()
+
+    page_col.caption(f"Page {page + 1} of {page_count}")
+
+    with next_col:
+        if page < page_count - 1 and st.button("Next ➡", key=f"{state_key}_next"):
+            st.session_state[f"{state_key}_page"] = page + 1
+            st.rerun()
+
+    return items[page * page_size:(page + 1) * page_size]
+
+
+def replica_page(collection, state_key, where=None, order_by=None, page_size=PAGE_SIZE):
+    # One page straight from SQLite (LIMIT + keyset), for render_pager(..., cursor=replica_cursor(order_by))
+    replica = get_replica(tenant)
+    if replica is None or not replica.is_fresh(collection):
+        return None
+    cursors = st.session_state.setdefault(f"{state_key}_cursors", [None])
+    return replica.read(collection, where, order_by, limit=page_size + 1, after=cursors[-1])
+
+
+def replica_cursor(order_by):
+    # Timestamps go back to the ISO strings they are stored as
+    def cursor(row):
+        value = row.get(order_by)
+        return (_replica_default(value) if isinstance(value, datetime) else value, row["doc_id"])
+    return cursor
+
+# ---------------- ARCHIVE ----------------
+
+ARCHIVE_PREFIX = "archive_"  # filled by `python jobs.py archive`
+# `jobs.py archive --to jsonl` leaves only a counting stub here, marked with this
+# field; the full record lives in the named .jsonl.gz file off Firestore
+COLD_ARCHIVE_FIELD = "cold_archive"
+
+
+def archive_collection(collection):
+    return db.collection(ARCHIVE_PREFIX + collection)
+
+
+def live_and_archived(collection, build_query, include=True, kind="read"):
+    # build_query(collection_ref) -> query, run on the live collection and (when
+    # include is set) on its archive. The archive job keeps document IDs, so a
+    # record it copied but has not deleted yet is returned once. kind must match
+    # the guarded() call this runs under
+    sources = [db.collection(collection)] + ([archive_collection(collection)] if include else [])
+    docs = {}
+    for source in sources:
+        for doc in build_query(source).stream(**rpc(kind)):
+            docs.setdefault(doc.id, doc)
+    return list(docs.values())
+
+
+def restore_archived_meeting(meeting_id):
+    # jobs.py never archives the current meeting, but one archived before that
+    # rule (or reactivated from an old ID) gets its records moved back, so the
+    # duplicate checks, the Dashboard and the next snapshot see all of them
+    ops = []
+    for collection in ("attendance_details", "meeting_details"):
+        docs = guarded("archive_restore", lambda: list(
+            archive_collection(collection).where("meeting_id", "==", meeting_id).stream(**rpc("maintenance"))
+        ), kind="maintenance")
+        for doc in docs:
+            ops.append(("set", db.collection(collection).document(doc.id), doc.to_dict(), {}))
+            ops.append(("delete", doc.reference, None, {}))
+    # BATCH_LIMIT is even, so a copy and its delete always share a batch
+    for start in range(0, len(ops), BATCH_LIMIT):
+        commit_writes(ops[start:start + BATCH_LIMIT])
+    return len(ops) // 2
+
+
+def include_archived(key):
+    # Archive collections are only read when someone asks for them
+    return st.toggle(
+        "🗄️ Include archived", key=key,
+        help="Shows the archive_* collections. Records exported to .jsonl.gz files are not shown."
+    )
+
+
+def render_archived(query, state_key, render_item):
+    st.markdown("#### 🗄️ Archived")
+    try:
+        docs = stream_page(query, state_key, "archive")
+    except BackendUnavailable as e:
+        st.warning(str(e))
+        return
+    docs = render_pager(state_key, docs)
+    if not docs:
+        st.info("Nothing archived here.")
+    for doc in docs:
+        data = doc.to_dict()
+        if data.get(COLD_ARCHIVE_FIELD):
+            st.caption(f"🧊 Stored offline in {data[COLD_ARCHIVE_FIELD]}")
+            continue
+        render_item(data)
+
+# ---------------- LIKES ----------------
+
+RECENT_LIKERS = 5
+LIKERS_PAGE_SIZE = 10
+
+
+def like_update(recent_likers, user_name, liked_at):
+    # Bumps the counter and the small preview kept on the parent document
+    recent = [n for n in recent_likers if n != user_name]
+    return {
+        "likes": firestore.Increment(1),
+        "recent_likers": ([user_name] + recent)[:RECENT_LIKERS],
+        "trend_score": firestore.Increment(trend_weight(liked_at))
+    }
+
+
+@firestore.transactional
+def like_in_transaction(transaction, item_ref, like_ref, like, liked_at):
+    # The preview is read and rewritten in one transaction, so likes that land
+    # together cannot drop each other's names (Firestore retries on contention)
+    snapshot = item_ref.get(["recent_likers"], transaction=transaction, **rpc("write"))
+    recent_likers = (snapshot.to_dict() or {}).get("recent_likers", []) if snapshot.exists else []
+    transaction.set(like_ref, like)
+    transaction.update(item_ref, like_update(recent_likers, like["name"], liked_at))
+
+
+def add_like(collection, doc_id, item, user_id, user_name, liked_at):
+    item_ref = db.collection(collection).document(doc_id)
+    # The likes entry records the user, to prevent duplicate likes
+    like_ref = item_ref.collection("likes").document()
+    like = {
+        "user_id": user_id,
+        "name": user_name,
+        "liked_at": liked_at
+    }
+
+    if get_write_behind() is None:
+        guarded("like", lambda: like_in_transaction(db.transaction(), item_ref, like_ref, like, liked_at), kind="write")
+        return
+
+    # Queued likes cannot hold a transaction open, so the preview is rebuilt from
+    # this page's copy; a like queued alongside another may drop a name from it
+    # until `python jobs.py reconcile --only likes` recomputes recent_likers
+    submit_write([
+        ("set", like_ref, like, {}),
+        ("update", item_ref, like_update(item.get("recent_likers", []), user_name, liked_at), {}),
+    ], "like", (collection, doc_id))
+
+
+def like_pending(collection, doc_id):
+    # Liked in this session but not flushed yet (write-behind only)
+    return (collection, doc_id) in pending_overlay("like")
+
+
+def has_liked(collection, doc_id, user_id):
+    # None when the check was skipped (read budget or outage): the like button is hidden
+    if like_pending(collection, doc_id):
+        return True
+    like_query = db.collection(collection).document(doc_id).collection("likes") \
+        .where("user_id", "==", user_id) \
+        .select(["user_id"]) \
+        .limit(1)
+    try:
+        return bool(guarded("like_check", lambda: list(like_query.stream(**rpc()))))
+    except BackendUnavailable:
+        return None
+
+
+def render_liked_by(collection, doc_id, item):
+    # Collapsed view only uses the preview on the parent document
+    preview = item.get("recent_likers", [])
+    if preview:
+        st.caption("Recently liked by: " + ", ".join(preview))
+
+    if not item.get("likes", 0):
+        st.info("No likes yet.")
+        return
+
+    # The likes subcollection is read only when the user asks for it
+    if not st.toggle("👍 Show everyone who liked this", key=f"likers_{collection}_{doc_id}"):
+        return
+
+    pager_key = f"likers_page_{collection}_{doc_id}"
+    likers_query = db.collection(collection).document(doc_id).collection("likes") \
+        .select(LIKER_FIELDS) \
+        .order_by("liked_at", direction=firestore.Query.DESCENDING)
+
+    likers = stream_page(likers_query, pager_key, "likers", LIKERS_PAGE_SIZE)
+    likers = render_pager(pager_key, likers, LIKERS_PAGE_SIZE)
+    like_data = [l.to_dict() for l in likers]
+
+    if like_data:
+        df_likes = pd.DataFrame(like_data)
+        st.dataframe(df_likes[["name", "liked_at"]], use_container_width=True)
+
+# ---------------- TRENDING ----------------
+
+# score = sum over events (creation + each like) of 2 ** ((t - TREND_EPOCH) / half-life).
+# Newer events weigh exponentially more, so ordering by the stored score is a
+# time-decayed ranking that only ever needs increments. Scores grow by 2**52 a
+# year, far from float overflow; move the epoch forward (here and in jobs.py)
+# and run `python jobs.py recompute-trending` if this ever runs for decades.
+TREND_EPOCH = datetime(2026, 1, 1)
+TREND_HALF_LIFE_HOURS = 24 * 7
+TRENDING_LIMIT = 10
+
+
+def app_timezone():
+    # The zone legacy "%Y-%m-%d %H:%M" strings were written in, and the one times
+    # are shown in: [timezone] name = "Asia/Kolkata" (or APP_TZ), UTC by default
+    try:
+        name = st.secrets.get("timezone", {}).get("name")
+    except Exception:
+        name = None
+    try:
+        return ZoneInfo(name or os.environ.get("APP_TZ") or "UTC")
+    except (ValueError, KeyError):
+        return timezone.utc
+
+
+APP_TZ = app_timezone()
+
+
+def to_utc_naive(value):
+    # Native timestamps are UTC (naive ones from utcnow() included)
+    if isinstance(value, str):
+        try:
+            value = datetime.strptime(value, "%Y-%m-%d %H:%M").replace(tzinfo=APP_TZ)
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    return None
+
+
+def to_app_tz(value):
+    utc = to_utc_naive(value)
+    return None if utc is None else utc.replace(tzinfo=timezone.utc).astimezone(APP_TZ)
+
+
+def format_ts(value, fmt="%Y-%m-%d %H:%M %Z"):
+    # Older records store "%Y-%m-%d %H:%M" strings, newer ones native timestamps;
+    # both are shown in the app's zone, labelled
+    local = to_app_tz(value)
+    if local is None:
+        return value or "N/A"
+    return local.strftime(fmt)
+
+
+def ts_sort_key(value):
+    # Sorts legacy string timestamps and native ones on the same axis until the migration has run
+    return to_app_tz(value) or datetime.min.replace(tzinfo=timezone.utc)
+
+
+def trend_weight(event_time=None):
+    event_time = to_utc_naive(event_time) or datetime.utcnow()
+    hours = (event_time - TREND_EPOCH).total_seconds() / 3600
+    return 2 ** (hours / TREND_HALF_LIFE_HOURS)
+
+
+def trending_query(collection, base_query=None):
+    query = base_query if base_query is not None else db.collection(collection)
+    return query.order_by("trend_score", direction=firestore.Query.DESCENDING)
+
+# ---------------- DUPLICATE DETECTION ----------------
+
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16  # 4 signature rows per band
+NEAR_DUPLICATE_THRESHOLD = 0.6
+NEAR_DUPLICATE_INDEX_TTL = 600  # seconds between catch-up reads of new submissions
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)
+_MINHASH_PARAMS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+
+def normalise_text(text):
+    return " ".join(text.lower().split())
+
+
+def submission_id(author, text):
+    # Same author + same normalised text -> same document ID, so a create-only
+    # write is the duplicate check
+    return hashlib.sha256(f"{author}\n{normalise_text(text)}".encode()).hexdigest()
+
+
+def shingles(text, size=3):
+    words = re.findall(r"\w+", normalise_text(text))
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash_signature(text):
+    hashed = [
+        int.from_bytes(hashlib.blake2b(sh.encode(), digest_size=8).digest(), "big")
+        for sh in shingles(text)
+    ]
+    if not hashed:
+        return None
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashed)
+        for a, b in _MINHASH_PARAMS
+    )
+
+
+class NearDuplicateIndex:
+    # MinHash signatures bucketed by LSH bands, held in memory per process
+    def __init__(self):
+        self.signatures = {}
+        self.texts = {}
+        self.buckets = {}
+        self.built_at = 0.0
+        self.synced_through = None  # created_at up to which the collection has been read
+        self._lock = threading.Lock()
+
+    def _bands(self, signature):
+        rows = MINHASH_PERMUTATIONS // LSH_BANDS
+        for band in range(LSH_BANDS):
+            yield band, signature[band * rows:(band + 1) * rows]
+
+    def add(self, doc_id, text):
+        signature = minhash_signature(text)
+        if signature is None:
+            return
+        with self._lock:
+            self.signatures[doc_id] = signature
+            self.texts[doc_id] = text
+            for band in self._bands(signature):
+                self.buckets.setdefault(band, set()).add(doc_id)
+
+    def similar(self, text, threshold=NEAR_DUPLICATE_THRESHOLD, limit=3):
+        signature = minhash_signature(text)
+        if signature is None:
+            return []
+        with self._lock:
+            candidates = set()
+            for band in self._bands(signature):
+                candidates |= self.buckets.get(band, set())
+            scored = []
+            for doc_id in candidates:
+                other = self.signatures[doc_id]
+                score = sum(x == y for x, y in zip(signature, other)) / MINHASH_PERMUTATIONS
+                if score >= threshold:
+                    scored.append((score, doc_id, self.texts[doc_id]))
+        return sorted(scored, reverse=True)[:limit]
+
+
+@st.cache_resource
+def get_near_duplicate_indexes(tenant):
+    return {"lock": threading.Lock(), "indexes": {}, "building": set()}
+
+
+def sync_near_duplicate_index(holder, policy, collection, text_field, created_field):
+    # Runs on its own thread (no st.* calls; the policy is passed in). The first
+    # run seeds the index from every record, legacy auto-ID and archived ones
+    # included; later runs only read what was created since the previous one
+    try:
+        with holder["lock"]:
+            index = holder["indexes"][collection]
+        started = datetime.now(timezone.utc)
+        if index.synced_through is None:
+            docs = policy.call("near_duplicate_seed", lambda: live_and_archived(
+                collection, lambda ref: ref.select([text_field]), kind="maintenance"
+            ), kind="maintenance")
+        else:
+            since = index.synced_through
+            docs = policy.call("near_duplicate_sync", lambda: list(
+                db.collection(collection).where(created_field, ">=", since).select([text_field]).stream(**rpc())
+            ))
+        for doc in docs:
+            index.add(doc.id, doc.to_dict().get(text_field, ""))
+        # A small overlap covers writes whose timestamps trail the server clock
+        index.synced_through = started - timedelta(minutes=1)
+        index.built_at = time.time()
+    except Exception as e:
+        logger.warning("near-duplicate index sync failed for %s: %s", collection, e)
+    finally:
+        with holder["lock"]:
+            holder["building"].discard(collection)
+
+
+def near_duplicate_index(collection, text_field, created_field="created_at"):
+    # Never reads on the request path: syncing happens on a background thread and
+    # the index is used as it stands meanwhile (empty until the first seed is done;
+    # exact resubmits are still caught by submission_id)
+    holder = get_near_duplicate_indexes(tenant)
+    with holder["lock"]:
+        index = holder["indexes"].setdefault(collection, NearDuplicateIndex())
+        due = time.time() - index.built_at > NEAR_DUPLICATE_INDEX_TTL
+        if due and collection not in holder["building"]:
+            holder["building"].add(collection)
+            threading.Thread(
+                target=sync_near_duplicate_index,
+                args=(holder, get_call_policy(), collection, text_field, created_field),
+                name=f"near-duplicates-{collection}",
+                daemon=True
+            ).start()
+    return index
+
+# ---------------- USER DIRECTORY ----------------
+
+# Display fields only: password hashes are never fetched for the directory
+USER_DIRECTORY_FIELDS = ["name", "father_name", "mobile", "is_blocked", "role"]
+USER_DIRECTORY_TTL = 300  # seconds
+
+
+class UserDirectory:
+    # Users keyed by document ID plus a sorted (token, user_id) list for prefix search
+    def __init__(self, user_docs):
+        self.users = {}
+        tokens = []
+
+        for doc in user_docs:
+            data = doc.to_dict()
+            data["id"] = doc.id
+            self.users[doc.id] = data
+            words = f"{data.get('name', '')} {data.get('father_name', '')}".lower().split()
+            for token in set(words + [str(data.get("mobile", ""))]):
+                if token:
+                    tokens.append((token, doc.id))
+
+        self.tokens = sorted(tokens)
+        self.built_at = time.time()
+        self._unbilled = max(1, len(self.users))
+        self._billing_lock = threading.Lock()
+
+    def take_reads(self):
+        # The users scan is charged once, to the page run that rebuilt the directory
+        with self._billing_lock:
+            reads, self._unbilled = self._unbilled, 0
+        return reads
+
+    def _prefix_matches(self, prefix):
+        matches = set()
+        i = bisect.bisect_left(self.tokens, (prefix, ""))
+        while i < len(self.tokens) and self.tokens[i][0].startswith(prefix):
+            matches.add(self.tokens[i][1])
+            i += 1
+        return matches
+
+    def search(self, text):
+        # Every word typed must prefix-match a name, father name or mobile token
+        words = text.lower().split()
+        if not words:
+            ids = set(self.users)
+        else:
+            ids = self._prefix_matches(words[0])
+            for word in words[1:]:
+                ids &= self._prefix_matches(word)
+        return sorted(
+            (self.users[i] for i in ids),
+            key=lambda u: (u.get("name") or "").lower()
+        )
+
+
+@st.cache_resource
+def get_user_directory_holder(tenant):
+    return {"directory": None}
+
+
+def load_user_directory(holder):
+    directory = holder["directory"]
+    if directory is None or time.time() - directory.built_at > USER_DIRECTORY_TTL:
+        directory = UserDirectory(db.collection("users").select(USER_DIRECTORY_FIELDS).stream(**rpc()))
+        holder["directory"] = directory
+    return directory
+
+
+def invalidate_user_directory():
+    get_user_directory_holder(tenant)["directory"] = None
+
+
+# ---------------- BULK USER ACTIONS ----------------
+
+BULK_ACTIONS = ["Block", "Unblock", "Reset Password"]
+HASH_POOL_WORKERS = 4
+
+
+@st.cache_resource
+def get_hash_pool():
+    # bcrypt gets its own small pool: a bulk reset must not queue every
+    # session's page reads behind hundreds of hashes
+    return ThreadPoolExecutor(max_workers=HASH_POOL_WORKERS, thread_name_prefix="bcrypt")
+
+
+def prepare_bulk_updates(users, action, on_progress):
+    # Returns ({user_id: fields}, {user_id: error}); bcrypt runs in the hash pool
+    # because it releases the GIL, so N resets cost about N / workers hashes
+    updates, errors = {}, {}
+
+    if action in ("Block", "Unblock"):
+        for user in users:
+            updates[user["id"]] = {"is_blocked": action == "Block"}
+        on_progress(len(users))
+        return updates, errors
+
+    pool = get_hash_pool()
+    futures = {}
+    for user in users:
+        mobile = str(user.get("mobile") or "")
+        if len(mobile) < 4:
+            errors[user["id"]] = "No valid mobile number"
+            continue
+        futures[pool.submit(hash_password, mobile[-4:])] = user["id"]
+
+    done = len(errors)
+    for future in as_completed(futures):
+        user_id = futures[future]
+        try:
+            updates[user_id] = {"password_hash": future.result(), "must_change_password": True}
+        except Exception as e:
+            errors[user_id] = str(e)
+        done += 1
+        on_progress(done)
+
+    return updates, errors
+
+
+def commit_user_updates(updates, on_progress):
+    # One WriteBatch per BATCH_LIMIT users; a failed batch marks all of its users failed
+    results = {}
+    items = list(updates.items())
+
+    for start in range(0, len(items), BATCH_LIMIT):
+        chunk = items[start:start + BATCH_LIMIT]
+        batch = db.batch()
+        for user_id, fields in chunk:
+            batch.update(db.collection("users").document(user_id), fields)
+        try:
+            guarded("bulk_users", lambda: batch.commit(**rpc("write")), kind="write")
+            for user_id, _ in chunk:
+                results[user_id] = "OK"
+        except Exception as e:
+            for user_id, _ in chunk:
+                results[user_id] = f"Failed: {e}"
+        on_progress(start + len(chunk))
+
+    return results
+
+# ---------------- MEETING SNAPSHOTS ----------------
+
+
+def tally_votes(vote_rows):
+    # One {choice: count} dict per vote field, blanks grouped as "Not Specified"
+    tallies = {field: {} for field in VOTE_FIELDS}
+
+    for data in vote_rows:
+        for field in VOTE_FIELDS:
+            value = data.get(field) or "Not Specified"
+            tallies[field][value] = tallies[field].get(value, 0) + 1
+
+    return tallies
+
+
+def build_meeting_snapshot(meeting_id):
+    # A snapshot must be complete, so these reads are outside the page budget
+    records = fetch_concurrently(
+        budgeted=False,
+        attendance=lambda: list(
+            db.collection("attendance_details").where("meeting_id", "==", meeting_id)
+            .select(ATTENDANCE_FIELDS).stream(**rpc())
+        ),
+        votes=lambda: list(
+            db.collection("meeting_details").where("meeting_id", "==", meeting_id)
+            .select(VOTE_FIELDS).stream(**rpc())
+        ),
+    )
+    attendance_rows = [doc.to_dict() for doc in records["attendance"]]
+    vote_rows = [doc.to_dict() for doc in records["votes"]]
+
+    attendees = []
+    yes_count = 0
+
+    for rec in attendance_rows:
+        status = rec.get("attending", "No")
+        if status == "Yes":
+            yes_count += 1
+        attendees.append({
+            "name": rec.get("name", ""),
+            "user_id": rec.get("user_id"),
+            "attending": status,
+            "reason": rec.get("reason", ""),
+            "submitted_at": rec.get("submitted_at"),
+        })
+
+    return {
+        "meeting_id": meeting_id,
+        "is_final": True,
+        "closed_at": datetime.utcnow(),
+        "attendance_yes": yes_count,
+        "attendance_no": len(attendance_rows) - yes_count,
+        "attendees": attendees,
+        "vote_tallies": tally_votes(vote_rows),
+        "total_votes": len(vote_rows),
+    }
+
+
+def write_meeting_snapshot(meeting_id):
+    # Frozen summary read by the history viewer instead of the raw collections
+    snapshot = build_meeting_snapshot(meeting_id)
+    snap_ref = db.collection("meeting_snapshots").document(str(meeting_id))
+    guarded("snapshot_write", lambda: snap_ref.set(snapshot, **rpc("write")), kind="write")
+
+    # Exact counts replace the running ones kept on the history index
+    update_history_entry(meeting_id, {
+        "status": "Closed",
+        "attendance_count": snapshot["attendance_yes"] + snapshot["attendance_no"],
+        "vote_count": snapshot["total_votes"],
+    })
+    return snapshot
+
+
+def update_history_entry(meeting_id, fields):
+    entry_ref = db.collection("meetings_history_list").document(str(meeting_id))
+    guarded("history_entry", lambda: entry_ref.set(fields, merge=True, **rpc("write")), kind="write")
+
+
+def history_index_query(search):
+    history_query = db.collection("meetings_history_list").select(HISTORY_FIELDS)
+    if search:
+        return history_query \
+            .where("meeting_id", ">=", search) \
+            .where("meeting_id", "<", search + "\uf8ff") \
+            .order_by("meeting_id")
+    return history_query.order_by("created_at", direction=firestore.Query.DESCENDING)
+
+
+def invalidate_meeting_snapshot(meeting_id):
+    # Reactivated meetings keep collecting data, so the old snapshot is no longer final
+    snap_ref = db.collection("meeting_snapshots").document(str(meeting_id))
+    if guarded("snapshot_check", lambda: snap_ref.get(["is_final"], **rpc()), budgeted=False).exists:
+        guarded("snapshot_write", lambda: snap_ref.update({"is_final": False}, **rpc("write")), kind="write")
+
+
+def render_vote_charts(tallies, titles):
+    vc1, vc2 = st.columns(2)
+    with vc1:
+        draw_pie(tallies.get("agenda", {}), titles["agenda"])
+        draw_pie(tallies.get("date", {}), titles["date"])
+    with vc2:
+        draw_pie(tallies.get("time", {}), titles["time"])
+        draw_pie(tallies.get("place", {}), titles["place"])
+
+# ---------------- MEMBER STATS ----------------
+
+BATCH_LIMIT = 400  # Firestore allows 500 writes per batch; keep headroom
+
+
+MEMBER_COUNTERS = ["meetings_attended", "meetings_declined", "meetings_voted"]
+
+
+def record_member_activity(user_id, name, field):
+    # Incremental per-member counters, so the leaderboard never scans history.
+    # Increment(0) creates the other counters too: order_by() skips documents
+    # that lack the field, so a member who only voted would never be listed
+    if not user_id:
+        return
+    stats_ref = db.collection("member_stats").document(str(user_id))
+    fields = {counter: firestore.Increment(1 if counter == field else 0) for counter in MEMBER_COUNTERS}
+    guarded("member_stats", lambda: stats_ref.set({
+        "user_id": user_id,
+        "name": name,
+        **fields,
+        "last_seen": datetime.utcnow()
+    }, merge=True, **rpc("write")), kind="write")
+
+
+def backfill_member_stats():
+    # Rebuilds every member_stats document from the raw attendance and vote records,
+    # archived ones included (a maintenance scan, so outside the page budget)
+    records = fetch_concurrently(
+        budgeted=False,
+        kind="maintenance",
+        attendance=lambda: live_and_archived(
+            "attendance_details", lambda ref: ref.select(["user_id", "name", "attending", "submitted_at"]),
+            kind="maintenance"
+        ),
+        votes=lambda: live_and_archived(
+            "meeting_details", lambda ref: ref.select(["user_id", "name_father", "voted_at"]),
+            kind="maintenance"
+        ),
+    )
+
+    stats = {}
+
+    def entry(user_id, name):
+        return stats.setdefault(str(user_id), {
+            "user_id": user_id,
+            "name": name,
+            "meetings_attended": 0,
+            "meetings_declined": 0,
+            "meetings_voted": 0,
+            "last_seen": None
+        })
+
+    def touch(item, seen_at):
+        if seen_at and (item["last_seen"] is None or ts_sort_key(seen_at) > ts_sort_key(item["last_seen"])):
+            item["last_seen"] = seen_at
+
+    for doc in records["attendance"]:
+        rec = doc.to_dict()
+        if not rec.get("user_id"):
+            continue
+        item = entry(rec["user_id"], rec.get("name", ""))
+        if rec.get("attending") == "Yes":
+            item["meetings_attended"] += 1
+        else:
+            item["meetings_declined"] += 1
+        touch(item, rec.get("submitted_at"))
+
+    for doc in records["votes"]:
+        rec = doc.to_dict()
+        if not rec.get("user_id"):
+            continue
+        item = entry(rec["user_id"], rec.get("name_father", ""))
+        item["meetings_voted"] += 1
+        touch(item, rec.get("voted_at"))
+
+    # Stored counters are read after the scan and corrected by the difference, so
+    # increments that land while the corrections are written are kept, not overwritten
+    stored = {
+        doc.id: doc.to_dict() or {}
+        for doc in guarded("member_stats_backfill", lambda: list(
+            db.collection("member_stats").select(MEMBER_STATS_FIELDS).stream(**rpc("maintenance"))
+        ), kind="maintenance")
+    }
+
+    ops = []
+    for doc_id in set(stats) | set(stored):
+        item = stats.get(doc_id) or {counter: 0 for counter in MEMBER_COUNTERS}
+        current = stored.get(doc_id, {})
+        fix = {}
+        for counter in MEMBER_COUNTERS:
+            delta = item[counter] - current.get(counter, 0)
+            # Increment(0) still creates a missing counter
+            if delta or counter not in current:
+                fix[counter] = firestore.Increment(delta)
+        if doc_id in stats:
+            fix.update({"user_id": item["user_id"], "name": item["name"]})
+            if item["last_seen"] and ts_sort_key(item["last_seen"]) > ts_sort_key(current.get("last_seen")):
+                fix["last_seen"] = item["last_seen"]
+        if fix:
+            ops.append(("set", db.collection("member_stats").document(doc_id), fix, {"merge": True}))
+
+    for start in range(0, len(ops), BATCH_LIMIT):
+        commit_writes(ops[start:start + BATCH_LIMIT])
+
+    return len(stats)
+
+# ---------------- TEAM SUMMARIES ----------------
+
+TEAMS = ["Jury Team", "Task Team", "Monitoring Team", "Data Team"]
+
+
+def team_summary_op(team, member_name, created_at):
+    return ("set", db.collection("team_summaries").document(team), {
+        "team": team,
+        "entry_count": firestore.Increment(1),
+        "members": {member_name: firestore.Increment(1)},
+        "last_activity": created_at
+    }, {"merge": True})
+
+
+def rebuild_team_summary(team):
+    # One-off scan for teams whose summary predates incremental tracking
+    members = {}
+    last_activity = None
+    entry_count = 0
+    team_docs = guarded("team_summary_rebuild", lambda: live_and_archived(
+        "teams", lambda ref: ref.where("team", "==", team).select(["name", "created_at"]), kind="maintenance"
+    ), kind="maintenance")
+
+    for doc in team_docs:
+        data = doc.to_dict()
+        entry_count += 1
+        member = data.get("name", "")
+        members[member] = members.get(member, 0) + 1
+        created_at = data.get("created_at")
+        # Legacy string timestamps cannot be compared with native ones
+        if hasattr(created_at, "strftime") and (last_activity is None or created_at > last_activity):
+            last_activity = created_at
+
+    summary = {
+        "team": team,
+        "entry_count": entry_count,
+        "members": members,
+        "last_activity": last_activity
+    }
+    summary_ref = db.collection("team_summaries").document(team)
+    guarded("team_summary", lambda: summary_ref.set(summary, **rpc("write")), kind="write")
+    return summary
+
+# ---------------- CACHE WARMER ----------------
+# After a restart the first visitors would otherwise pay for the gRPC channel,
+# auth token and matplotlib start-up. Once per process a background thread runs
+# the hot reads the pages make (same queries, same stale-cache keys) and renders
+# the dashboard charts into the chart cache. Disable with [warmup] enabled = false
+# (or CACHE_WARMUP=0).
+
+DASHBOARD_CHART_TITLES = {
+    "agenda": "Agenda Distribution",
+    "date": "Date Distribution",
+    "time": "Time Distribution",
+    "place": "Place Distribution",
+}
+
+
+# Firestore orders every string after every timestamp, so a plain DESC order
+# puts unmigrated "%Y-%m-%d %H:%M" rows ahead of the newest real timestamps
+TIMESTAMP_FLOOR = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def newest_first(query, field, limit=None, kind="read"):
+    if limit is None:
+        return list(query.order_by(field, direction=firestore.Query.DESCENDING).stream(**rpc(kind)))
+    # Real timestamps first; legacy strings (all older) fill whatever room is left
+    docs = list(query.where(field, ">=", TIMESTAMP_FLOOR)
+                .order_by(field, direction=firestore.Query.DESCENDING).limit(limit).stream(**rpc(kind)))
+    if len(docs) < limit:
+        docs += list(query.where(field, ">=", "")
+                     .order_by(field, direction=firestore.Query.DESCENDING).limit(limit - len(docs)).stream(**rpc(kind)))
+    return docs
+
+
+def read_notice_feed(view, limit=None, kind="read"):
+    if view == "Trending":
+        return list(trending_query("notices").select(NOTICE_FIELDS).limit(TRENDING_LIMIT).stream(**rpc(kind)))
+    return newest_first(db.collection("notices").select(NOTICE_FIELDS), "posted_at", limit, kind)
+
+
+def read_funds(collection, limit=None, kind="read"):
+    fields = FUNDS_RECEIVED_FIELDS if collection == "funds_received" else FUNDS_SPENT_FIELDS
+    return newest_first(db.collection(collection).select(fields), "date_time", limit, kind)
+
+
+def meeting_votes_query(meeting_id):
+    return db.collection("meeting_details") \
+        .where("meeting_id", "==", meeting_id) \
+        .select(VOTE_TABLE_FIELDS)
+
+
+class CacheWarmer:
+    STEPS = [
+        "Notices (latest)", "Notices (trending)", "Meeting settings",
+        "Funds received", "Funds spent", "Fund totals", "Dashboard votes", "Dashboard charts",
+    ]
+
+    def __init__(self, policy, chart_cache, tenant, caps):
+        # Dependencies are passed in: no st.* calls happen on the warm-up thread.
+        # caps holds the list limits the pages would use, so every warmed copy is
+        # a result the page itself could have stored under the same key
+        self._policy = policy
+        self._chart_cache = chart_cache
+        self._tenant = tenant
+        self._caps = caps
+        self._lock = threading.Lock()
+        self.progress = {name: {"Step": name, "Status": "pending", "Time (ms)": None, "Detail": ""} for name in self.STEPS}
+        self.started_at = datetime.utcnow()
+        self.finished_at = None
+        threading.Thread(target=self._run, name="cache-warmer", daemon=True).start()
+
+    def _step(self, name, fn):
+        with self._lock:
+            self.progress[name]["Status"] = "running"
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            status, detail, result = "failed", str(e), None
+        else:
+            status, detail = "done", f"{len(result)} items" if isinstance(result, list) else ""
+        with self._lock:
+            self.progress[name].update({
+                "Status": status,
+                "Time (ms)": round((time.perf_counter() - started) * 1000, 1),
+                "Detail": detail
+            })
+        return result
+
+    def _read(self, op, fn, cache_key):
+        # Off the request path, so these get the maintenance deadline
+        return self._policy.call(op, fn, kind="maintenance", cache_key=f"{self._tenant}:{cache_key}")
+
+    def _run(self):
+        for view in ("Latest", "Trending"):
+            # Trending is always limited to TRENDING_LIMIT
+            notice_cap = self._caps["notices"] if view == "Latest" else None
+            self._step(f"Notices ({view.lower()})", lambda: self._read(
+                "notices", lambda: read_notice_feed(view, notice_cap, kind="maintenance"), f"notices:{view}"
+            ))
+
+        settings_doc = self._step("Meeting settings", lambda: self._read(
+            "meeting_settings", lambda: db.collection("admin_settings").document("meeting_options").get(**rpc("maintenance")),
+            "meeting_options"
+        ))
+
+        fund_cap = self._caps["funds"]
+        fund_lists = [
+            self._step(name, lambda: self._read(
+                collection, lambda: read_funds(collection, fund_cap, kind="maintenance"), collection
+            ))
+            for collection, name in (("funds_received", "Funds received"), ("funds_spent", "Funds spent"))
+        ]
+        # A cut-short table makes the page read the server-side totals too
+        if fund_cap is not None and any(rows is not None and len(rows) >= fund_cap for rows in fund_lists):
+            self._step("Fund totals", lambda: [
+                self._read(
+                    f"{collection}_total", lambda: db.collection(collection).sum("amount").get(**rpc("maintenance")),
+                    f"{collection}:total"
+                )
+                for collection in ("funds_received", "funds_spent")
+            ])
+
+        meeting_id = None
+        if settings_doc is not None and settings_doc.exists:
+            meeting_id = settings_doc.to_dict().get("meeting_id")
+
+        votes = None
+        if meeting_id is not None:
+            votes = self._step("Dashboard votes", lambda: self._read(
+                "dashboard_votes", lambda: list(meeting_votes_query(meeting_id).stream(**rpc("maintenance"))),
+                f"votes:{meeting_id}"
+            ))
+        if votes:
+            self._step("Dashboard charts", lambda: self._render_charts([v.to_dict() for v in votes]))
+
+        with self._lock:
+            for entry in self.progress.values():
+                if entry["Status"] == "pending":
+                    entry["Status"] = "skipped"
+            self.finished_at = datetime.utcnow()
+
+    def _render_charts(self, vote_rows):
+        # Same keys draw_pie computes, so the dashboard finds the PNGs ready
+        rendered = []
+        for field, tally in tally_votes(vote_rows).items():
+            if tally:
+                title = DASHBOARD_CHART_TITLES[field]
+                self._chart_cache.put(chart_key(tally, title), render_pie_png(tally, title))
+                rendered.append(title)
+        return rendered
+
+    def snapshot(self):
+        with self._lock:
+            return [dict(entry) for entry in self.progress.values()]
+
+
+def warmup_enabled():
+    try:
+        enabled = st.secrets.get("warmup", {}).get("enabled", True)
+    except Exception:
+        enabled = True
+    return bool(enabled) and os.environ.get("CACHE_WARMUP") != "0"
+
+
+@st.cache_resource
+def get_cache_warmer(tenant):
+    # Once per process and chapter; the queries use this run's chapter-scoped db
+    if not warmup_enabled():
+        return None
+    caps = {
+        "notices": fresh_share("Public Notice Board", **NOTICE_LIST_SHARE),
+        "funds": fresh_share("Fund Mngmnt", **FUND_LIST_SHARE),
+    }
+    return CacheWarmer(get_call_policy(), get_chart_cache(), tenant, caps)
+
+
+get_cache_warmer(tenant)
+
+# ---------------- PROFILER ----------------
+# Admin-only, opt-in (?profile=1 or the sidebar switch). A sampling thread reads
+# the script thread's stack every few ms, so page code runs unmodified and
+# nothing happens at all when profiling is off. Runs cut short by st.stop() or
+# st.rerun() are reported at the top of the next run.
+
+PROFILE_INTERVAL = 0.005  # seconds between stack samples
+PROFILE_TOP = 15
+# Innermost matching frame decides where a sample's time went
+PROFILE_CATEGORIES = [
+    ("Firestore / gRPC", ("google/cloud", "google/api_core", "grpc", "proto/")),
+    ("Waiting on worker threads (Firestore calls)", ("concurrent/futures", "threading.py")),
+    ("pandas", ("/pandas/", "/numpy/")),
+    ("matplotlib", ("/matplotlib/", "/PIL/")),
+    ("bcrypt", ("/bcrypt/",)),
+    ("Streamlit widgets", ("/streamlit/",)),
+]
+
+
+class RunSampler(threading.Thread):
+    def __init__(self, thread_id, module_frame, interval=PROFILE_INTERVAL):
+        super().__init__(name="run-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.module_frame = module_frame
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self.wall = None
+        self.reported = False
+        self._halt = threading.Event()
+        self._began = time.perf_counter()
+
+    def run(self):
+        while not self._halt.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            in_run = False
+            while frame is not None:
+                in_run = in_run or frame is self.module_frame
+                stack.append((frame.f_code.co_filename, frame.f_code.co_name, frame.f_lineno))
+                frame = frame.f_back
+            if not in_run:
+                break  # the script run ended early (st.stop, st.rerun or an exception)
+            key = tuple(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+        self.wall = time.perf_counter() - self._began
+        self.module_frame = None
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+
+
+def profiler_requested():
+    if st.session_state.get("role") != "Admin":
+        return False
+    return st.query_params.get("profile") == "1" or st.session_state.get("profile_runs", False)
+
+
+def start_profiler(module_frame):
+    sampler = RunSampler(threading.get_ident(), module_frame)
+    st.session_state["profile_pending"] = sampler
+    sampler.start()
+    return sampler
+
+
+def short_path(filename):
+    for marker in ("site-packages/", "lib/python"):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return os.path.basename(filename)
+
+
+def profile_tables(sampler):
+    ms_per_sample = sampler.wall * 1000 / max(sampler.samples, 1)
+    categories = {}
+    hotspots = {}
+    app_lines = {}
+
+    for stack, count in sampler.stacks.items():
+        category = "App code / Python"
+        for filename, _, _ in reversed(stack):
+            match = next((name for name, markers in PROFILE_CATEGORIES if any(m in filename for m in markers)), None)
+            if match:
+                category = match
+                break
+        categories[category] = categories.get(category, 0) + count
+
+        filename, func, line = stack[-1]
+        leaf = f"{func} ({short_path(filename)}:{line})"
+        hotspots[leaf] = hotspots.get(leaf, 0) + count
+
+        # Inclusive time per line of this file, counted once per sample
+        for app_line in {(line, func) for filename, func, line in stack if filename == __file__}:
+            app_lines[app_line] = app_lines.get(app_line, 0) + count
+
+    def rows(counts, label, top=PROFILE_TOP):
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:top]
+        return pd.DataFrame([{
+            label: key if isinstance(key, str) else f"line {key[0]} ({key[1]})",
+            "Time (ms)": round(count * ms_per_sample, 1),
+            "Share": f"{count / max(sampler.samples, 1):.0%}"
+        } for key, count in ranked])
+
+    return rows(categories, "Where"), rows(hotspots, "Hotspot (self time)"), rows(app_lines, "app.py line (inclusive)")
+
+
+def folded_stacks(sampler):
+    # Collapsed-stack format, opens in speedscope or flamegraph.pl
+    lines = []
+    for stack, count in sampler.stacks.items():
+        frames = ";".join(f"{func} ({short_path(filename)}:{line})" for filename, func, line in stack)
+        lines.append(f"{frames} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def render_profile(sampler, title, key):
+    sampler.reported = True
+    with st.expander(f"⏱ {title}: {sampler.wall * 1000:.0f} ms, {sampler.samples} samples", expanded=True):
+        if not sampler.samples:
+            st.info("The run finished before the first sample.")
+            return
+        where, hotspots, app_lines = profile_tables(sampler)
+        st.dataframe(where, use_container_width=True, hide_index=True)
+        hot_col, line_col = st.columns(2)
+        hot_col.dataframe(hotspots, use_container_width=True, hide_index=True)
+        line_col.dataframe(app_lines, use_container_width=True, hide_index=True)
+        st.download_button(
+            "Download profile (.folded)",
+            folded_stacks(sampler),
+            file_name=f"profile-{datetime.utcnow():%Y%m%d-%H%M%S}.folded",
+            key=key
+        )
+
+
+def render_previous_profile():
+    # A run that ended in st.stop()/st.rerun() never reached the report at the bottom
+    sampler = st.session_state.pop("profile_pending", None)
+    if sampler is None or sampler.reported:
+        return
+    sampler.join(timeout=1)
+    if sampler.wall is not None:
+        render_profile(sampler, "Profile of the previous run (ended early)", "profile_previous_download")
+
+
+def finish_profiler(sampler):
+    sampler.stop()
+    st.session_state.pop("profile_pending", None)
+    st.divider()
+    render_profile(sampler, "Profile of this run", "profile_download")
+
 # ---------------- SESSION ----------------
 # ---------------- SESSION STATE ----------------
 # ---------------- SESSION STATE ----------------
@@ -151,10 +2218,19 @@ default_states = {
     "user_id": None,
 }
 
+# A login (and every cursor or overlay) belongs to one chapter
+if st.session_state.get("tenant", tenant) != tenant:
+    st.session_state.clear()
+st.session_state["tenant"] = tenant
+
 for key, value in default_states.items():
     if key not in st.session_state:
         st.session_state[key] = value
 
+if st.session_state.get("role") == "Admin":
+    render_previous_profile()
+profiler = start_profiler(sys._getframe()) if profiler_requested() else None
+
 
 # ---------------- SIDEBAR ----------------
 # ---------------- SIDEBAR ----------------
@@ -163,6 +2239,8 @@ for key, value in default_states.items():
 with st.sidebar:
 
     st.markdown("## Volunteer Portal")
+    if tenant != DEFAULT_TENANT:
+        st.caption(f"Chapter: {tenant}")
     st.markdown("---")
 
     # Initialize menu state
@@ -219,6 +2297,11 @@ with st.sidebar:
 
     # Define the final 'menu' variable so the rest of your app knows what page to show
     menu = st.session_state.menu
+    budget = ReadBudget(menu, page_read_budget(menu))
+
+    if st.session_state.role == "Admin":
+        st.markdown("---")
+        st.toggle("⏱ Profile page runs", key="profile_runs", help="Or open the app with ?profile=1")
 # ---------------- PUBLIC NOTICE BOARD ----------------
 # ---------------- PUBLIC NOTICE BOARD ----------------
 # ---------------- PUBLIC NOTICE BOARD ----------------
@@ -247,35 +2330,76 @@ if menu == "Public Notice Board":
             if notice_text.strip() == "" or auto_name.strip() == "":
                 st.warning("Name and notice text are required.")
             else:
-                db.collection("notices").add({
+                new_notice = {
                     "notice": notice_text.strip(),
                     "name_father": auto_name,
-                    "posted_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                    "posted_at": datetime.utcnow(),
                     "is_pinned": False,
-                    "likes": 0  # Initialize likes counter to 0 for new notices
-                })
+                    "likes": 0,  # Initialize likes counter to 0 for new notices
+                    "trend_score": trend_weight()
+                }
+                notice_ref = db.collection("notices").document(form_token("notice"))
+                try:
+                    submit_write(
+                        [("create", notice_ref, new_notice, {})],
+                        "notice", dict(new_notice, doc_id=notice_ref.id, is_pending=True)
+                    )
+                except BackendUnavailable as e:
+                    st.error(str(e))
+                    st.stop()
+                consume_form_token("notice")
                 st.success("Notice posted successfully.")
                 st.rerun()
 
     st.divider()
 
     # ================= FETCH & DISPLAY =================
-    notices = db.collection("notices").stream()
-    notice_list = []
-
-    for notice_doc in notices:
-        data = notice_doc.to_dict()
-        data["doc_id"] = notice_doc.id
-        notice_list.append(data)
-
-    notice_list = sorted(
-        notice_list,
-        key=lambda x: (
-            x.get("is_pinned", False),
-            x.get("posted_at", "")
-        ),
-        reverse=True
-    )
+    view_col, archive_col = st.columns([3, 1])
+    notice_view = view_col.radio("Show", ["Latest", "Trending"], horizontal=True, key="notice_view")
+    with archive_col:
+        show_archived = include_archived("notices_archived")
+
+    if notice_view == "Trending":
+        notice_list = replica_rows("notices", order_by="trend_score", limit=TRENDING_LIMIT)
+    else:
+        notice_list = replica_rows("notices", order_by="posted_at")
+
+    if notice_list is not None:
+        render_replica_badge("notices")
+    else:
+        notice_cap = None
+        if notice_view == "Latest":
+            # Each notice also costs a like check, so the list gets half of what is left
+            notice_cap = budget.share(**NOTICE_LIST_SHARE)
+        try:
+            notices = guarded(
+                "notices", lambda: read_notice_feed(notice_view, notice_cap), cache_key=f"notices:{notice_view}"
+            )
+        except BackendUnavailable as e:
+            st.warning(str(e))
+            st.stop()
+        if notice_cap is not None and len(notices) >= notice_cap:
+            st.caption(f"Showing the latest {notice_cap} notices.")
+        notice_list = []
+
+        for notice_doc in notices:
+            data = notice_doc.to_dict()
+            data["doc_id"] = notice_doc.id
+            notice_list.append(data)
+
+    # Notices this session posted that are still in the write-behind queue
+    posted_ids = {n["doc_id"] for n in notice_list}
+    notice_list += [n for n in pending_overlay("notice") if n["doc_id"] not in posted_ids]
+
+    if notice_view == "Latest":
+        notice_list = sorted(
+            notice_list,
+            key=lambda x: (
+                x.get("is_pinned", False),
+                ts_sort_key(x.get("posted_at"))
+            ),
+            reverse=True
+        )
 
     if not notice_list:
         st.info("No notices available.")
@@ -285,15 +2409,17 @@ if menu == "Public Notice Board":
             notice_id = data.get("doc_id")
             notice_text = data.get("notice", "")
             name_father = data.get("name_father", "Unknown")
-            posted_at = data.get("posted_at", "")
+            posted_at = format_ts(data.get("posted_at"))
             is_pinned = data.get("is_pinned", False)
-            likes = data.get("likes", 0) # Fetch current likes
+            likes = data.get("likes", 0) + like_pending("notices", notice_id) # Fetch current likes
 
             with st.container(border=True):
 
                 header_col1, header_col2 = st.columns([4,1])
 
                 with header_col1:
+                    if data.get("is_pending"):
+                        st.caption("⏳ Posting...")
                     if is_pinned:
                         st.markdown("**📌 Pinned Notice**")
                     st.markdown(f"### {notice_text}")
@@ -302,9 +2428,13 @@ if menu == "Public Notice Board":
 
                 with header_col2:
                     if st.button("Pin / Unpin", key=f"pin_{notice_id}"):
-                        db.collection("notices").document(notice_id).update({
-                            "is_pinned": not is_pinned
-                        })
+                        try:
+                            guarded("notice_pin", lambda: db.collection("notices").document(notice_id).update({
+                                "is_pinned": not is_pinned
+                            }, **rpc("write")), kind="write")
+                        except BackendUnavailable as e:
+                            st.error(str(e))
+                            st.stop()
                         st.rerun()
 
                 # -------- ADMIN ACTIONS --------
@@ -320,15 +2450,25 @@ if menu == "Public Notice Board":
                             key=f"edit_{notice_id}"
                         )
                         if st.button("Save", key=f"save_{notice_id}"):
-                            db.collection("notices").document(notice_id).update({
-                                "notice": new_text.strip()
-                            })
+                            try:
+                                guarded("notice_edit", lambda: db.collection("notices").document(notice_id).update({
+                                    "notice": new_text.strip()
+                                }, **rpc("write")), kind="write")
+                            except BackendUnavailable as e:
+                                st.error(str(e))
+                                st.stop()
                             st.success("Notice updated.")
                             st.rerun()
 
                     with edit_col2:
                         if st.button("Delete", key=f"delete_{notice_id}"):
-                            db.collection("notices").document(notice_id).delete()
+                            try:
+                                guarded("notice_delete", lambda: db.collection("notices").document(notice_id).delete(
+                                    **rpc("write")
+                                ), kind="write")
+                            except BackendUnavailable as e:
+                                st.error(str(e))
+                                st.stop()
                             st.success("Notice deleted.")
                             st.rerun()
 
@@ -343,38 +2483,36 @@ if menu == "Public Notice Board":
                     user_name = "Anonymous User"
 
                 # Check if this exact user has already liked this specific notice
-                existing_like = db.collection("notices") \
-                    .document(notice_id) \
-                    .collection("likes") \
-                    .where("user_id", "==", user_id) \
-                    .stream()
+                liked = has_liked("notices", notice_id, user_id)
 
-                if not list(existing_like):
+                if liked is None:
+                    st.caption("Likes are paused on this page right now.")
+                elif not liked:
                     if st.button("🤍 Like", key=f"like_notice_{notice_id}"):
-                        
-                        # 1. Record the user to prevent duplicate likes
-                        db.collection("notices") \
-                            .document(notice_id) \
-                            .collection("likes") \
-                            .add({
-                                "user_id": user_id,
-                                "name": user_name,
-                                "liked_at": datetime.now().strftime("%Y-%m-%d %H:%M")
-                            })
-
-                        # 2. Increment the main likes counter on the notice document
-                        db.collection("notices") \
-                            .document(notice_id) \
-                            .update({
-                                "likes": likes + 1
-                            })
-
+                        try:
+                            add_like("notices", notice_id, data, user_id, user_name, datetime.utcnow())
+                        except BackendUnavailable as e:
+                            st.error(str(e))
+                            st.stop()
                         st.rerun()
                 else:
                     st.markdown("❤️ *You liked this*")
 
             st.markdown(" ")
 
+    if show_archived:
+        def render_archived_notice(data):
+            with st.container(border=True):
+                st.markdown(f"### {data.get('notice', '')}")
+                st.caption(f"Posted by {data.get('name_father', 'Unknown')} • {format_ts(data.get('posted_at'))}")
+                st.markdown(f"❤️ **{data.get('likes', 0)}** Likes")
+
+        render_archived(
+            archive_collection("notices").select(NOTICE_FIELDS)
+            .order_by("posted_at", direction=firestore.Query.DESCENDING),
+            f"notices_archive_{notice_view}", render_archived_notice
+        )
+
 # ---------------- TRANSPARENT FUND MANAGEMENT ----------------
 # ---------------- FUND MNGMNT ----------------
 elif menu == "Fund Mngmnt":
@@ -384,39 +2522,74 @@ elif menu == "Fund Mngmnt":
     st.divider()
 
     # ================= FETCH DATA & CALCULATE TOTALS =================
-    # Fetch Received Funds
-    received_stream = db.collection("funds_received").stream()
+    fund_totals = None
+    fund_rows = {
+        "received": replica_rows("funds_received"),
+        "spent": replica_rows("funds_spent"),
+    }
+
+    if fund_rows["received"] is not None and fund_rows["spent"] is not None:
+        render_replica_badge("funds_received")
+    else:
+        # Both collections are read in parallel, each within half of the page's budget
+        fund_cap = budget.share(**FUND_LIST_SHARE)
+        fund_docs = fetch_concurrently(
+            received=(lambda: read_funds("funds_received", fund_cap), "funds_received"),
+            spent=(lambda: read_funds("funds_spent", fund_cap), "funds_spent"),
+        )
+        fund_rows = {key: [doc.to_dict() for doc in docs] for key, docs in fund_docs.items()}
+
+        if fund_cap is not None and max(len(rows) for rows in fund_rows.values()) >= fund_cap:
+            # Lists are cut short: totals come from server-side sums (or their last
+            # good copy), never from the shortened lists
+            try:
+                fund_sums = fetch_concurrently(
+                    received=(lambda: db.collection("funds_received").sum("amount").get(**rpc()), "funds_received:total"),
+                    spent=(lambda: db.collection("funds_spent").sum("amount").get(**rpc()), "funds_spent:total"),
+                )
+                fund_totals = {key: float(result[0][0].value or 0) for key, result in fund_sums.items()}
+            except BackendUnavailable:
+                fund_totals = "unavailable"
+            st.info(f"Showing the latest {fund_cap} records per table to keep this page fast.")
+
+    # Received Funds
     received_list = []
     total_received = 0.0
 
-    for doc in received_stream:
-        data = doc.to_dict()
+    for data in fund_rows["received"]:
         received_list.append(data)
         total_received += float(data.get("amount", 0))
 
-    # Fetch Spent Funds
-    spent_stream = db.collection("funds_spent").stream()
+    # Spent Funds
     spent_list = []
     total_spent = 0.0
 
-    for doc in spent_stream:
-        data = doc.to_dict()
+    for data in fund_rows["spent"]:
         spent_list.append(data)
         total_spent += float(data.get("amount", 0))
 
+    if isinstance(fund_totals, dict):
+        total_received, total_spent = fund_totals["received"], fund_totals["spent"]
+
     # Calculate Remaining
     remaining_balance = total_received - total_spent
 
     # ================= DISPLAY METRICS =================
     m1, m2, m3 = st.columns(3)
-    m1.metric("💰 Total Received", f"₹ {total_received:,.2f}")
-    m2.metric("💸 Total Spent", f"₹ {total_spent:,.2f}")
-    
-    # Color code the remaining balance
-    if remaining_balance < 0:
-        m3.metric("📉 Remaining", f"₹ {remaining_balance:,.2f}")
+    if fund_totals == "unavailable":
+        m1.metric("💰 Total Received", "Unavailable")
+        m2.metric("💸 Total Spent", "Unavailable")
+        m3.metric("🏦 Remaining", "Unavailable")
+        st.warning("Totals could not be loaded right now. The tables below show only the latest records.")
     else:
-        m3.metric("🏦 Remaining", f"₹ {remaining_balance:,.2f}")
+        m1.metric("💰 Total Received", f"₹ {total_received:,.2f}")
+        m2.metric("💸 Total Spent", f"₹ {total_spent:,.2f}")
+
+        # Color code the remaining balance
+        if remaining_balance < 0:
+            m3.metric("📉 Remaining", f"₹ {remaining_balance:,.2f}")
+        else:
+            m3.metric("🏦 Remaining", f"₹ {remaining_balance:,.2f}")
 
     st.divider()
 
@@ -444,23 +2617,26 @@ elif menu == "Fund Mngmnt":
                         if source.strip() == "" or amount_rec <= 0:
                             st.warning("Source and a valid amount are required.")
                         else:
-                            db.collection("funds_received").add({
-                                "date_time": get_ist_time().strftime("%Y-%m-%d %H:%M") if 'get_ist_time' in globals() else datetime.now().strftime("%Y-%m-%d %H:%M"),
+                            create_once(db.collection("funds_received").document(form_token("funds_received")), {
+                                "date_time": datetime.utcnow(),
                                 "source": source.strip(),
                                 "amount": amount_rec,
                                 "mode": mode,
                                 "transaction_details": trans_details.strip(),
                                 "added_by": st.session_state.get("name", "Admin")
                             })
+                            consume_form_token("funds_received")
                             st.success("Fund received record added!")
                             st.rerun()
 
         # Display Received Data Table (Visible to all logged-in users)
         if received_list:
             df_rec = pd.DataFrame(received_list)
+            df_rec = df_rec.assign(sort_key=df_rec["date_time"].map(ts_sort_key)) \
+                .sort_values(by="sort_key", ascending=False)
+            df_rec["date_time"] = df_rec["date_time"].map(format_ts)
             df_rec = df_rec[["date_time", "source", "amount", "mode", "transaction_details"]]
             df_rec.columns = ["Date & Time", "Received From", "Amount (₹)", "Mode", "Transaction Info"]
-            df_rec = df_rec.sort_values(by="Date & Time", ascending=False)
             
             st.dataframe(df_rec, use_container_width=True, hide_index=True)
         else:
@@ -485,22 +2661,25 @@ elif menu == "Fund Mngmnt":
                         if purpose.strip() == "" or amount_spent <= 0 or payee.strip() == "":
                             st.warning("Purpose, Payee, and a valid amount are required.")
                         else:
-                            db.collection("funds_spent").add({
-                                "date_time": get_ist_time().strftime("%Y-%m-%d %H:%M") if 'get_ist_time' in globals() else datetime.now().strftime("%Y-%m-%d %H:%M"),
+                            create_once(db.collection("funds_spent").document(form_token("funds_spent")), {
+                                "date_time": datetime.utcnow(),
                                 "purpose": purpose.strip(),
                                 "payee": payee.strip(),
                                 "amount": amount_spent,
                                 "added_by": st.session_state.get("name", "Admin")
                             })
+                            consume_form_token("funds_spent")
                             st.success("Fund spent record added!")
                             st.rerun()
 
         # Display Spent Data Table (Visible to all logged-in users)
         if spent_list:
             df_spent = pd.DataFrame(spent_list)
+            df_spent = df_spent.assign(sort_key=df_spent["date_time"].map(ts_sort_key)) \
+                .sort_values(by="sort_key", ascending=False)
+            df_spent["date_time"] = df_spent["date_time"].map(format_ts)
             df_spent = df_spent[["date_time", "purpose", "payee", "amount"]]
             df_spent.columns = ["Date & Time", "Purpose / Work", "Paid To", "Amount (₹)"]
-            df_spent = df_spent.sort_values(by="Date & Time", ascending=False)
             
             st.dataframe(df_spent, use_container_width=True, hide_index=True)
         else:
@@ -528,7 +2707,11 @@ elif menu == "Login":
 
         if login_clicked:
 
-            user = get_user_by_mobile(mobile.strip())
+            try:
+                user = get_user_by_mobile(mobile.strip())
+            except BackendUnavailable as e:
+                st.error(str(e))
+                st.stop()
 
             if not user:
                 st.error("User not found.")
@@ -582,13 +2765,16 @@ elif menu == "Login":
                     st.stop()
 
                 hashed_password = hash_password(new_password)
+                user_ref = db.collection("users").document(st.session_state.get("temp_user_id"))
 
-                db.collection("users").document(
-                    st.session_state.get("temp_user_id")
-                ).update({
-                    "password_hash": hashed_password,
-                    "must_change_password": False
-                })
+                try:
+                    guarded("password_update", lambda: user_ref.update({
+                        "password_hash": hashed_password,
+                        "must_change_password": False
+                    }, **rpc("write")), kind="write")
+                except BackendUnavailable as e:
+                    st.error(str(e))
+                    st.stop()
 
                 st.session_state.force_password_change = False
                 st.session_state.temp_user_id = None
@@ -626,35 +2812,29 @@ elif menu == "Login":
                         st.error("Mobile number must be exactly 10 digits.")
                         st.stop()
 
-                    # Check existing user
-                    existing_user = list(
+                    existing_user = guarded("registration_check", lambda: list(
                         db.collection("users")
                         .where("mobile", "==", reg_mobile)
-                        .stream()
-                    )
+                        .select(["mobile"])
+                        .limit(1)
+                        .stream(**rpc())
+                    ), budgeted=False)
 
                     if existing_user:
                         st.warning("User already registered. Please login.")
                         st.stop()
 
-                    # Check existing pending request
-                    existing_request = list(
-                        db.collection("registration_requests")
-                        .where("mobile", "==", reg_mobile)
-                        .stream()
-                    )
-
-                    if existing_request:
-                        st.warning("Registration already pending approval.")
-                        st.stop()
-
-                    db.collection("registration_requests").add({
+                    # The mobile number is the request ID, so a second request
+                    # (or a double-clicked one) cannot be created
+                    if not create_once(db.collection("registration_requests").document(reg_mobile), {
                         "name": reg_name,
                         "father_name": reg_father,
                         "mobile": reg_mobile,
                         "status": "pending",
                         "requested_at": datetime.utcnow()
-                    })
+                    }):
+                        st.warning("Registration already pending approval.")
+                        st.stop()
 
                     st.success("Registration submitted successfully.")
                     st.rerun()
@@ -676,7 +2856,11 @@ elif menu == "Change Password":
 
     if st.button("Update Password"):
 
-        user = get_user_by_mobile(mobile.strip())
+        try:
+            user = get_user_by_mobile(mobile.strip())
+        except BackendUnavailable as e:
+            st.error(str(e))
+            st.stop()
 
         if not user:
             st.error("User not found.")
@@ -697,10 +2881,14 @@ elif menu == "Change Password":
 
         hashed_password = hash_password(new_password)
 
-        db.collection("users").document(user["id"]).update({
-            "password_hash": hashed_password,
-            "must_change_password": False
-        })
+        try:
+            guarded("password_update", lambda: db.collection("users").document(user["id"]).update({
+                "password_hash": hashed_password,
+                "must_change_password": False
+            }, **rpc("write")), kind="write")
+        except BackendUnavailable as e:
+            st.error(str(e))
+            st.stop()
 
         st.success("Password updated successfully.")
 #================= MEETING MANAGEMENT =================#
@@ -713,7 +2901,7 @@ elif menu == "Meetings":
     try:
         with st.spinner("Loading meeting details..."):
             meeting_ref = db.collection("admin_settings").document("meeting_options")
-            meeting_doc = meeting_ref.get()
+            meeting_doc = guarded("meeting_settings", lambda: meeting_ref.get(**rpc()), cache_key="meeting_options")
     except Exception as e:
         st.error(f"Error loading meeting configuration: {e}")
         st.stop()
@@ -765,25 +2953,33 @@ elif menu == "Meetings":
         try:
             with st.spinner("Submitting attendance..."):
 
-                existing = list(
+                existing = guarded("attendance_check", lambda: list(
                     db.collection("attendance_details")
                     .where("meeting_id", "==", meeting_id)
                     .where("user_id", "==", user_id)
-                    .stream()
-                )
+                    .select(["user_id"])
+                    .limit(1)
+                    .stream(**rpc())
+                ), budgeted=False)
 
                 if existing:
                     st.error("You have already submitted attendance.")
                     st.stop()
 
-                db.collection("attendance_details").add({
+                guarded("attendance_submit", lambda: db.collection("attendance_details").add({
                     "meeting_id": meeting_id,
                     "name": clean_name,
                     "user_id": user_id,
                     "attending": attending,
                     "reason": reason.strip() if attending == "No" else "",
                     "submitted_at": datetime.utcnow()
-                })
+                }, **rpc("write")), kind="write")
+                update_history_entry(meeting_id, {"attendance_count": firestore.Increment(1)})
+                record_member_activity(
+                    user_id,
+                    clean_name,
+                    "meetings_attended" if attending == "Yes" else "meetings_declined"
+                )
 
             st.success("Attendance recorded successfully.")
             st.rerun()
@@ -795,13 +2991,26 @@ elif menu == "Meetings":
     st.subheader("Live Attendance Summary")
 
     try:
-        # Fetch all records for this specific meeting
-        attendance_records = list(
-            db.collection("attendance_details")
-            .where("meeting_id", "==", meeting_id)
-            .stream()
+        # Fetch the records for this specific meeting, within what the page has left
+        meeting_attendance = db.collection("attendance_details").where("meeting_id", "==", meeting_id)
+        attendance_query, attendance_cap = budget.cap(meeting_attendance.select(ATTENDANCE_FIELDS), reserve=3)
+        attendance_records = guarded(
+            "attendance_summary", lambda: list(attendance_query.stream(**rpc())), cache_key=f"attendance:{meeting_id}"
         )
 
+        attendance_totals = None
+        if attendance_cap is not None and len(attendance_records) >= attendance_cap:
+            # The list is cut short: counts come from the server and the user's
+            # own response is looked up directly
+            attendance_totals = fetch_concurrently(
+                yes=(lambda: meeting_attendance.where("attending", "==", "Yes").count().get(**rpc()),
+                     f"attendance:{meeting_id}:yes"),
+                total=(lambda: meeting_attendance.count().get(**rpc()), f"attendance:{meeting_id}:total"),
+                mine=lambda: list(
+                    meeting_attendance.where("user_id", "==", user_id).select(ATTENDANCE_FIELDS).limit(1).stream(**rpc())
+                ),
+            )
+
         if attendance_records:
             yes_count = 0
             no_count = 0
@@ -822,7 +3031,7 @@ elif menu == "Meetings":
 
                 if is_admin:
                     submitted_at = record.get("submitted_at")
-                    date_str = submitted_at.strftime("%Y-%m-%d %H:%M") if submitted_at else "N/A"
+                    date_str = format_ts(submitted_at)
                     admin_data.append({
                         "Name": record.get("name", "").title(),
                         "Date": date_str,
@@ -830,6 +3039,12 @@ elif menu == "Meetings":
                         "Reason": record.get("reason", "")
                     })
 
+            if attendance_totals is not None:
+                yes_count = int(attendance_totals["yes"][0][0].value)
+                no_count = int(attendance_totals["total"][0][0].value) - yes_count
+                if current_user_record is None and attendance_totals["mine"]:
+                    current_user_record = attendance_totals["mine"][0].to_dict()
+
             # Display metrics
             c1, c2 = st.columns(2)
             c1.metric("🟢 Attending (Yes)", yes_count)
@@ -837,6 +3052,8 @@ elif menu == "Meetings":
 
             if is_admin:
                 st.caption("Detailed attendance records, including absence reasons, are only visible to admins.")
+                if attendance_totals is not None:
+                    st.caption(f"Showing the first {attendance_cap} records.")
                 df = pd.DataFrame(admin_data)
                 st.dataframe(df, use_container_width=True, hide_index=True)
             elif current_user_record:
@@ -861,19 +3078,30 @@ elif menu == "Dashboard":
     st.divider()
 
     # ================= LOAD MEETING =================
-    try:
-        with st.spinner("Loading meeting data..."):
-            doc = db.collection("admin_settings").document("meeting_options").get()
-    except Exception as e:
-        st.error(f"Error loading meeting settings: {e}")
-        st.stop()
+    settings_rows = replica_rows("admin_settings")
+    settings = None
+
+    if settings_rows is not None:
+        settings = next((row for row in settings_rows if row["doc_id"] == "meeting_options"), None)
+    else:
+        try:
+            with st.spinner("Loading meeting data..."):
+                doc = guarded(
+                    "meeting_settings",
+                    lambda: db.collection("admin_settings").document("meeting_options").get(**rpc()),
+                    cache_key="meeting_options"
+                )
+        except Exception as e:
+            st.error(f"Error loading meeting settings: {e}")
+            st.stop()
+        settings = doc.to_dict() if doc.exists else None
 
-    if not doc.exists:
+    if not settings:
         st.error("Meeting settings not found.")
         st.stop()
 
-    meeting_id = doc.to_dict().get("meeting_id")
-    meeting_status = doc.to_dict().get("status", "Closed")
+    meeting_id = settings.get("meeting_id")
+    meeting_status = settings.get("status", "Closed")
 
     col1, col2 = st.columns(2)
     col1.info(f"Meeting ID: {meeting_id}")
@@ -882,79 +3110,38 @@ elif menu == "Dashboard":
     st.divider()
 
     # ================= LOAD VOTES =================
-    try:
-        with st.spinner("Fetching votes..."):
-            votes = list(
-                db.collection("meeting_details")
-                .where("meeting_id", "==", meeting_id)
-                .stream()
-            )
-    except Exception as e:
-        st.error(f"Error loading votes: {e}")
-        st.stop()
+    rows = replica_rows("meeting_details", where={"meeting_id": meeting_id})
+
+    if rows is not None:
+        rows = [{field: row.get(field) for field in VOTE_TABLE_FIELDS} for row in rows]
+        render_replica_badge("meeting_details")
+    else:
+        try:
+            with st.spinner("Fetching votes..."):
+                votes = guarded(
+                    "dashboard_votes",
+                    lambda: list(meeting_votes_query(meeting_id).stream(**rpc())),
+                    cache_key=f"votes:{meeting_id}"
+                )
+        except Exception as e:
+            st.error(f"Error loading votes: {e}")
+            st.stop()
+        rows = [vote.to_dict() for vote in votes]
 
-    if not votes:
+    if not rows:
         st.warning("No votes submitted yet.")
         st.stop()
 
-    agenda_count = {}
-    date_count = {}
-    time_count = {}
-    place_count = {}
-    rows = []
+    tallies = tally_votes(rows)
 
-    for vote in votes:
-        data = vote.to_dict()
-        rows.append(data)
-
-        # Safely get data, defaulting to "Not Specified" if blank
-        agenda = data.get("agenda") or "Not Specified"
-        date_val = data.get("date") or "Not Specified"
-        time_val = data.get("time") or "Not Specified"
-        place = data.get("place") or "Not Specified"
-
-        agenda_count[agenda] = agenda_count.get(agenda, 0) + 1
-        date_count[date_val] = date_count.get(date_val, 0) + 1
-        time_count[time_val] = time_count.get(time_val, 0) + 1
-        place_count[place] = place_count.get(place, 0) + 1
-
-    total_votes = len(votes)
+    total_votes = len(rows)
 
     st.metric("Total Votes", total_votes)
     st.divider()
 
     # ================= PIE CHARTS =================
-    # It is usually best to put imports at the very top of your file, but this works here too!
-  
-
-    def draw_pie(data_dict, title):
-        # Prevent crashes if a dictionary is somehow empty
-        if not data_dict:
-            st.info(f"No data for {title}")
-            return
-            
-        fig, ax = plt.subplots(figsize=(3,3))
-        ax.pie(
-            data_dict.values(),
-            labels=data_dict.keys(),
-            autopct="%1.1f%%",
-            startangle=90
-        )
-        ax.set_title(title)
-        st.pyplot(fig)
-        
-        # THE FIX: Always close the figure to prevent Streamlit memory warnings#
-        plt.close(fig) 
-
-    col1, col2 = st.columns(2)
-
-    with col1:
-        draw_pie(agenda_count, "Agenda Distribution")
-        draw_pie(date_count, "Date Distribution")
-
-    with col2:
-        draw_pie(time_count, "Time Distribution")
-        draw_pie(place_count, "Place Distribution")
+    # Rendered images are cached by tally contents (see draw_pie)
+    render_vote_charts(tallies, DASHBOARD_CHART_TITLES)
 
     st.divider()
 
@@ -976,7 +3163,7 @@ elif menu == "Teams":
 
     selected_team = st.selectbox(
         "Select Team",
-        ["Jury Team", "Task Team", "Monitoring Team", "Data Team"]
+        TEAMS
     )
 
     # ================= AUTO NAME =================
@@ -1010,29 +3197,98 @@ elif menu == "Teams":
 
             else:
 
-                db.collection("teams").add({
+                created_at = datetime.utcnow()
+                member_name = name.strip().lower()
+
+                new_entry = {
                     "team": selected_team,
-                    "name": name.strip().lower(),
+                    "name": member_name,
                     "user_id": st.session_state.get("user_id", "public"),
                     "details": details.strip(),
                     "created_by_role": st.session_state.get("role"),
-                    "created_at": datetime.now().strftime("%Y-%m-%d %H:%M")
-                })
+                    "created_at": created_at
+                }
+                # The summary increment shares the batch, so a replayed create counts nothing twice
+                try:
+                    submit_write([
+                        ("create", db.collection("teams").document(form_token(f"team_{selected_team}")), new_entry, {}),
+                        team_summary_op(selected_team, member_name, created_at),
+                    ], "team_entry", new_entry)
+                except BackendUnavailable as e:
+                    st.error(str(e))
+                    st.stop()
+                consume_form_token(f"team_{selected_team}")
 
                 st.success("Saved Successfully")
                 st.rerun()
 
+    # ================= SUMMARY =================
+    st.divider()
+
+    summary_ref = db.collection("team_summaries").document(selected_team)
+    try:
+        summary_doc = guarded("team_summary", lambda: summary_ref.get(**rpc()), cache_key=f"team_summary:{selected_team}")
+        summary = summary_doc.to_dict() if summary_doc.exists else rebuild_team_summary(selected_team)
+    except BackendUnavailable as e:
+        st.warning(str(e))
+        summary = {}
+    team_members = summary.get("members", {})
+
+    s1, s2, s3 = st.columns(3)
+    s1.metric("📝 Entries", summary.get("entry_count", 0))
+    s2.metric("👥 Active Members", len(team_members))
+    s3.metric("🕒 Last Activity", format_ts(summary.get("last_activity")))
+
     # ================= RECORDS =================
     st.divider()
     st.subheader("Team Records")
 
-    records = db.collection("teams").where(
-        "team", "==", selected_team
-    ).stream()
+    member_filter = st.selectbox(
+        "Filter by Member",
+        ["All Members"] + sorted(team_members.keys()),
+        format_func=lambda m: m if m == "All Members" else m.title()
+    )
 
-    for r in records:
-        data = r.to_dict()
+    records_query = db.collection("teams").where("team", "==", selected_team).select(TEAM_RECORD_FIELDS)
+    if member_filter != "All Members":
+        records_query = records_query.where("name", "==", member_filter)
+    records_query = records_query.order_by("created_at", direction=firestore.Query.DESCENDING)
+
+    records_key = f"teams_{selected_team}_{member_filter}"
+    try:
+        records = stream_page(records_query, records_key, "team_records")
+    except BackendUnavailable as e:
+        st.warning(str(e))
+        st.stop()
+    records = render_pager(records_key, records)
+
+    # Entries this session saved that are still in the write-behind queue
+    pending_entries = [
+        e for e in pending_overlay("team_entry")
+        if e["team"] == selected_team and member_filter in ("All Members", e["name"])
+    ]
+
+    if not records and not pending_entries:
+        st.info("No records for this team yet.")
+
+    for data in pending_entries:
         st.write(f"👤 {data.get('name')} — {data.get('details')}")
+        st.caption("⏳ Saving...")
+
+    def render_team_record(data):
+        st.write(f"👤 {data.get('name')} — {data.get('details')}")
+        st.caption(format_ts(data.get("created_at")))
+
+    for r in records:
+        render_team_record(r.to_dict())
+
+    if include_archived(f"teams_archived_{selected_team}"):
+        archived_query = archive_collection("teams").where("team", "==", selected_team) \
+            .select(TEAM_RECORD_FIELDS + [COLD_ARCHIVE_FIELD])
+        if member_filter != "All Members":
+            archived_query = archived_query.where("name", "==", member_filter)
+        archived_query = archived_query.order_by("created_at", direction=firestore.Query.DESCENDING)
+        render_archived(archived_query, f"{records_key}_archive", render_team_record)
 # ---------------- MEETINGS ----------------
 # ---------------- MEETINGS ----------------
 
@@ -1044,7 +3300,11 @@ elif menu == "Plan Next Meeting":
     st.title("Vote for Next Meeting")
 
     meeting_ref = db.collection("admin_settings").document("meeting_options")
-    meeting_doc = meeting_ref.get()
+    try:
+        meeting_doc = guarded("meeting_settings", lambda: meeting_ref.get(**rpc()), cache_key="meeting_options")
+    except BackendUnavailable as e:
+        st.warning(str(e))
+        st.stop()
 
     if not meeting_doc.exists:
         st.error("Meeting not configured by admin.")
@@ -1088,26 +3348,36 @@ elif menu == "Plan Next Meeting":
 
         if submit_vote:
 
-            existing_vote = db.collection("meeting_details") \
-                .where("meeting_id", "==", meeting_id) \
-                .where("user_id", "==", user_id) \
-                .stream()
+            try:
+                existing_vote = guarded("vote_check", lambda: list(
+                    db.collection("meeting_details")
+                    .where("meeting_id", "==", meeting_id)
+                    .where("user_id", "==", user_id)
+                    .select(["user_id"])
+                    .limit(1)
+                    .stream(**rpc())
+                ), budgeted=False)
+
+                if existing_vote:
+                    st.error("You have already voted.")
+                    st.stop()
 
-            if list(existing_vote):
-                st.error("You have already voted.")
+                guarded("vote_submit", lambda: db.collection("meeting_details").add({
+                    "meeting_id": meeting_id,
+                    "name_father": clean_name,
+                    "user_id": user_id,
+                    "agenda": selected_agenda,
+                    "date": selected_date,
+                    "time": selected_time,
+                    "place": selected_place,
+                    "voted_at": datetime.utcnow()
+                }, **rpc("write")), kind="write")
+                update_history_entry(meeting_id, {"vote_count": firestore.Increment(1)})
+                record_member_activity(user_id, clean_name, "meetings_voted")
+            except BackendUnavailable as e:
+                st.error(str(e))
                 st.stop()
 
-            db.collection("meeting_details").add({
-                "meeting_id": meeting_id,
-                "name_father": clean_name,
-                "user_id": user_id,
-                "agenda": selected_agenda,
-                "date": selected_date,
-                "time": selected_time,
-                "place": selected_place,
-                "voted_at": datetime.utcnow()
-            })
-
             st.success("Vote submitted successfully.")
             st.rerun()
         #---reports---#
@@ -1136,6 +3406,7 @@ elif menu == "Reports":
 
         with st.form("complaint_form"):
             complaint_text = st.text_area("Write Complaint")
+            skip_similar = st.checkbox("Submit even if a similar complaint already exists")
             submit = st.form_submit_button("Submit")
 
         if submit:
@@ -1146,24 +3417,35 @@ elif menu == "Reports":
                 st.warning("Complaint cannot be empty.")
                 st.stop()
 
-            # ✅ Prevent same complaint by same user
-            duplicate_check = db.collection("complaints") \
-                .where("created_by", "==", user_id) \
-                .where("complaint", "==", clean_text) \
-                .stream()
+            # 💡 Someone may already have raised this: collect likes instead of duplicates
+            if not skip_similar:
+                similar = near_duplicate_index("complaints", "complaint").similar(clean_text)
+                if similar:
+                    st.warning("Someone already raised something similar. Consider liking it instead:")
+                    for score, _, similar_text in similar:
+                        st.markdown(f"- {similar_text} *({score:.0%} similar)*")
+                    st.stop()
 
-            if list(duplicate_check):
+            # ✅ Prevent same complaint by same user: the ID is a hash of author + text
+            doc_id = submission_id(user_id, clean_text)
+            try:
+                guarded("complaint_create", lambda: db.collection("complaints").document(doc_id).create({
+                    "complaint": clean_text,
+                    "created_by": user_id,
+                    "created_name": user_name,
+                    "created_at": datetime.utcnow(),
+                    "likes": 0,
+                    "is_published": False,
+                    "trend_score": trend_weight()
+                }, **rpc("write")), kind="write")
+            except AlreadyExists:
                 st.error("You have already submitted this same complaint.")
                 st.stop()
+            except BackendUnavailable as e:
+                st.error(str(e))
+                st.stop()
 
-            db.collection("complaints").add({
-                "complaint": clean_text,
-                "created_by": user_id,
-                "created_name": user_name,
-                "created_at": datetime.utcnow(),
-                "likes": 0,
-                "is_published": False
-            })
+            near_duplicate_index("complaints", "complaint").add(doc_id, clean_text)
 
             st.success("Complaint submitted.")
             st.rerun()
@@ -1171,25 +3453,55 @@ elif menu == "Reports":
         st.divider()
         st.subheader("All Complaints")
 
-        complaints = db.collection("complaints").stream()
-        complaint_list = []
+        rank_col, filter_col = st.columns(2)
+        complaints_rank = rank_col.radio("Sort by", ["Most Liked", "Trending"], horizontal=True, key="complaints_rank")
+        published_only = filter_col.checkbox("Published only", key="complaints_published_only")
 
-        for c in complaints:
-            data = c.to_dict()
-            data["doc_id"] = c.id
-            complaint_list.append(data)
-
-        complaint_list = sorted(
-            complaint_list,
-            key=lambda x: x.get("likes", 0),
-            reverse=True
+        # Most liked (or trending) first, one page at a time
+        complaints_query = db.collection("complaints").select(COMPLAINT_FIELDS)
+        if published_only:
+            complaints_query = complaints_query.where("is_published", "==", True)
+        if complaints_rank == "Trending":
+            complaints_query = trending_query("complaints", complaints_query)
+        else:
+            complaints_query = complaints_query.order_by("likes", direction=firestore.Query.DESCENDING)
+
+        complaints_key = f"complaints_{published_only}_{complaints_rank}"
+        complaints_order = "trend_score" if complaints_rank == "Trending" else "likes"
+        complaint_list = replica_page(
+            "complaints",
+            f"{complaints_key}_replica",
+            where={"is_published": True} if published_only else None,
+            order_by=complaints_order
         )
 
+        if complaint_list is not None:
+            render_replica_badge("complaints")
+            complaint_list = render_pager(
+                f"{complaints_key}_replica", complaint_list, cursor=replica_cursor(complaints_order)
+            )
+        else:
+            try:
+                complaints = stream_page(complaints_query, complaints_key, "complaints")
+            except BackendUnavailable as e:
+                st.warning(str(e))
+                complaints = []
+            complaints = render_pager(complaints_key, complaints)
+            complaint_list = []
+
+            for c in complaints:
+                data = c.to_dict()
+                data["doc_id"] = c.id
+                complaint_list.append(data)
+
+        if not complaint_list:
+            st.info("No complaints yet.")
+
         for comp in complaint_list:
 
             doc_id = comp["doc_id"]
             text = comp.get("complaint")
-            likes = comp.get("likes", 0)
+            likes = comp.get("likes", 0) + like_pending("complaints", doc_id)
             is_published = comp.get("is_published", False)
             creator_name = comp.get("created_name")
 
@@ -1205,50 +3517,25 @@ elif menu == "Reports":
             # -------- LIKE --------
             if comp.get("created_by") != user_id:
 
-                existing_like = db.collection("complaints") \
-                    .document(doc_id) \
-                    .collection("likes") \
-                    .where("user_id", "==", user_id) \
-                    .stream()
+                liked = has_liked("complaints", doc_id, user_id)
 
-                if not list(existing_like):
+                if liked is None:
+                    st.caption("Likes are paused on this page right now.")
+                elif not liked:
 
                     if st.button("👍 Like", key=f"like_{doc_id}"):
-
-                        db.collection("complaints") \
-                            .document(doc_id) \
-                            .collection("likes") \
-                            .add({
-                                "user_id": user_id,
-                                "name": user_name,
-                                "liked_at": datetime.utcnow()
-                            })
-
-                        db.collection("complaints") \
-                            .document(doc_id) \
-                            .update({
-                                "likes": likes + 1
-                            })
-
+                        try:
+                            add_like("complaints", doc_id, comp, user_id, user_name, datetime.utcnow())
+                        except BackendUnavailable as e:
+                            st.error(str(e))
+                            st.stop()
                         st.rerun()
                 else:
                     st.success("You liked this.")
 
             # -------- Likes Table --------
             st.markdown("##### 👍 Liked By")
-
-            likes_docs = db.collection("complaints") \
-                .document(doc_id) \
-                .collection("likes") \
-                .stream()
-
-            like_data = [l.to_dict() for l in likes_docs]
-
-            if like_data:
-                df_likes = pd.DataFrame(like_data)
-                st.dataframe(df_likes[["name", "liked_at"]], use_container_width=True)
-            else:
-                st.info("No likes yet.")
+            render_liked_by("complaints", doc_id, comp)
 
             # -------- ADMIN PUBLISH --------
             if role == "Admin":
@@ -1256,24 +3543,46 @@ elif menu == "Reports":
                 if not is_published:
                     if st.button("🚀 Publish", key=f"publish_{doc_id}"):
 
-                        db.collection("complaints") \
-                            .document(doc_id) \
-                            .update({"is_published": True})
+                        try:
+                            guarded("complaint_publish", lambda: db.collection("complaints")
+                                    .document(doc_id)
+                                    .update({"is_published": True}, **rpc("write")), kind="write")
+                        except BackendUnavailable as e:
+                            st.error(str(e))
+                            st.stop()
 
                         st.success("Complaint Published.")
                         st.rerun()
                 else:
                     if st.button("❌ Unpublish", key=f"unpublish_{doc_id}"):
 
-                        db.collection("complaints") \
-                            .document(doc_id) \
-                            .update({"is_published": False})
+                        try:
+                            guarded("complaint_publish", lambda: db.collection("complaints")
+                                    .document(doc_id)
+                                    .update({"is_published": False}, **rpc("write")), kind="write")
+                        except BackendUnavailable as e:
+                            st.error(str(e))
+                            st.stop()
 
                         st.warning("Complaint Hidden.")
                         st.rerun()
 
             st.divider()
 
+        if include_archived("complaints_archived"):
+            def render_archived_complaint(data):
+                st.markdown(f"### 📝 {data.get('complaint')}")
+                st.markdown(f"👍 Likes: **{data.get('likes', 0)}**")
+                if data.get("is_published"):
+                    st.caption(f"👤 Complainer: {data.get('created_name')}")
+                st.divider()
+
+            archived_query = archive_collection("complaints").select(COMPLAINT_FIELDS)
+            if published_only:
+                archived_query = archived_query.where("is_published", "==", True)
+            archived_query = archived_query.order_by("likes", direction=firestore.Query.DESCENDING)
+            render_archived(archived_query, f"complaints_archive_{published_only}", render_archived_complaint)
+
     # ======================================================
     # ==================== SUGGESTIONS =====================
     # ======================================================
@@ -1284,6 +3593,7 @@ elif menu == "Reports":
 
         with st.form("suggestion_form"):
             suggestion_text = st.text_area("Write Suggestion")
+            skip_similar = st.checkbox("Submit even if a similar suggestion already exists")
             submit = st.form_submit_button("Submit")
 
         if submit:
@@ -1294,23 +3604,34 @@ elif menu == "Reports":
                 st.warning("Suggestion cannot be empty.")
                 st.stop()
 
-            # ✅ Prevent same suggestion by same user
-            duplicate_check = db.collection("suggestions") \
-                .where("created_by", "==", user_id) \
-                .where("suggestion", "==", clean_text) \
-                .stream()
+            # 💡 Someone may already have raised this: collect likes instead of duplicates
+            if not skip_similar:
+                similar = near_duplicate_index("suggestions", "suggestion").similar(clean_text)
+                if similar:
+                    st.warning("Someone already raised something similar. Consider liking it instead:")
+                    for score, _, similar_text in similar:
+                        st.markdown(f"- {similar_text} *({score:.0%} similar)*")
+                    st.stop()
 
-            if list(duplicate_check):
+            # ✅ Prevent same suggestion by same user: the ID is a hash of author + text
+            doc_id = submission_id(user_id, clean_text)
+            try:
+                guarded("suggestion_create", lambda: db.collection("suggestions").document(doc_id).create({
+                    "suggestion": clean_text,
+                    "created_by": user_id,
+                    "created_name": user_name,
+                    "created_at": datetime.utcnow(),
+                    "likes": 0,
+                    "trend_score": trend_weight()
+                }, **rpc("write")), kind="write")
+            except AlreadyExists:
                 st.error("You have already submitted this same suggestion.")
                 st.stop()
+            except BackendUnavailable as e:
+                st.error(str(e))
+                st.stop()
 
-            db.collection("suggestions").add({
-                "suggestion": clean_text,
-                "created_by": user_id,
-                "created_name": user_name,
-                "created_at": datetime.utcnow(),
-                "likes": 0
-            })
+            near_duplicate_index("suggestions", "suggestion").add(doc_id, clean_text)
 
             st.success("Suggestion submitted.")
             st.rerun()
@@ -1318,25 +3639,46 @@ elif menu == "Reports":
         st.divider()
         st.subheader("All Suggestions")
 
-        suggestions = db.collection("suggestions").stream()
-        suggestion_list = []
+        suggestions_rank = st.radio("Sort by", ["Most Liked", "Trending"], horizontal=True, key="suggestions_rank")
 
-        for s in suggestions:
-            data = s.to_dict()
-            data["doc_id"] = s.id
-            suggestion_list.append(data)
+        # Most liked (or trending) first, one page at a time
+        suggestions_query = db.collection("suggestions").select(SUGGESTION_FIELDS)
+        if suggestions_rank == "Trending":
+            suggestions_query = trending_query("suggestions", suggestions_query)
+        else:
+            suggestions_query = suggestions_query.order_by("likes", direction=firestore.Query.DESCENDING)
 
-        suggestion_list = sorted(
-            suggestion_list,
-            key=lambda x: x.get("likes", 0),
-            reverse=True
-        )
+        suggestions_key = f"suggestions_{suggestions_rank}"
+        suggestions_order = "trend_score" if suggestions_rank == "Trending" else "likes"
+        suggestion_list = replica_page("suggestions", f"{suggestions_key}_replica", order_by=suggestions_order)
+
+        if suggestion_list is not None:
+            render_replica_badge("suggestions")
+            suggestion_list = render_pager(
+                f"{suggestions_key}_replica", suggestion_list, cursor=replica_cursor(suggestions_order)
+            )
+        else:
+            try:
+                suggestions = stream_page(suggestions_query, suggestions_key, "suggestions")
+            except BackendUnavailable as e:
+                st.warning(str(e))
+                suggestions = []
+            suggestions = render_pager(suggestions_key, suggestions)
+            suggestion_list = []
+
+            for s in suggestions:
+                data = s.to_dict()
+                data["doc_id"] = s.id
+                suggestion_list.append(data)
+
+        if not suggestion_list:
+            st.info("No suggestions yet.")
 
         for sug in suggestion_list:
 
             doc_id = sug["doc_id"]
             text = sug.get("suggestion")
-            likes = sug.get("likes", 0)
+            likes = sug.get("likes", 0) + like_pending("suggestions", doc_id)
             creator_name = sug.get("created_name")
 
             st.markdown(f"### 💡 {text}")
@@ -1345,52 +3687,40 @@ elif menu == "Reports":
 
             if sug.get("created_by") != user_id:
 
-                existing_like = db.collection("suggestions") \
-                    .document(doc_id) \
-                    .collection("likes") \
-                    .where("user_id", "==", user_id) \
-                    .stream()
+                liked = has_liked("suggestions", doc_id, user_id)
 
-                if not list(existing_like):
+                if liked is None:
+                    st.caption("Likes are paused on this page right now.")
+                elif not liked:
 
                     if st.button("👍 Like", key=f"sug_like_{doc_id}"):
-
-                        db.collection("suggestions") \
-                            .document(doc_id) \
-                            .collection("likes") \
-                            .add({
-                                "user_id": user_id,
-                                "name": user_name,
-                                "liked_at": datetime.utcnow()
-                            })
-
-                        db.collection("suggestions") \
-                            .document(doc_id) \
-                            .update({
-                                "likes": likes + 1
-                            })
-
+                        try:
+                            add_like("suggestions", doc_id, sug, user_id, user_name, datetime.utcnow())
+                        except BackendUnavailable as e:
+                            st.error(str(e))
+                            st.stop()
                         st.rerun()
                 else:
                     st.success("You liked this.")
 
             # -------- Likes Table --------
             st.markdown("##### 👍 Liked By")
+            render_liked_by("suggestions", doc_id, sug)
 
-            likes_docs = db.collection("suggestions") \
-                .document(doc_id) \
-                .collection("likes") \
-                .stream()
-
-            like_data = [l.to_dict() for l in likes_docs]
+            st.divider()
 
-            if like_data:
-                df_likes = pd.DataFrame(like_data)
-                st.dataframe(df_likes[["name", "liked_at"]], use_container_width=True)
-            else:
-                st.info("No likes yet.")
+        if include_archived("suggestions_archived"):
+            def render_archived_suggestion(data):
+                st.markdown(f"### 💡 {data.get('suggestion')}")
+                st.markdown(f"👍 Likes: **{data.get('likes', 0)}**")
+                st.caption(f"👤 Suggested by: {data.get('created_name')}")
+                st.divider()
 
-            st.divider()
+            render_archived(
+                archive_collection("suggestions").select(SUGGESTION_FIELDS)
+                .order_by("likes", direction=firestore.Query.DESCENDING),
+                "suggestions_archive", render_archived_suggestion
+            )
 #------admin panel-----#
 #-------a--------------#
 # ================= ADMIN PANEL =================
@@ -1403,18 +3733,50 @@ elif menu == "Admin Panel":
 
     st.title("Admin Control Center")
 
+    # ======================================================
+    # PREFETCH (independent reads run in parallel)
+    # ======================================================
+    meeting_ref = db.collection("admin_settings").document("meeting_options")
+
+    # Widget values from the previous run are already in session state
+    history_search = st.session_state.get("history_search", "").strip()
+    history_key = f"history_{history_search}"
+    history_page_query = paged_query(history_index_query(history_search), history_key)
+    directory_holder = get_user_directory_holder(tenant)
+    # The users scan for the directory is not capped, so requests get half of what is left
+    requests_query, requests_cap = budget.cap(db.collection("registration_requests").select(REQUEST_FIELDS), parts=2)
+
+    try:
+        with st.spinner("Loading admin data..."):
+            admin_reads = fetch_concurrently(
+                requests=lambda: list(requests_query.stream(**rpc())),
+                directory=lambda: load_user_directory(directory_holder),
+                history=lambda: list(history_page_query.stream(**rpc())),
+                meeting=lambda: meeting_ref.get(**rpc()),
+            )
+    except Exception as e:
+        st.error(f"Error loading admin data: {e}")
+        st.stop()
+
+    meeting_doc = admin_reads["meeting"]
+    meeting_data = meeting_doc.to_dict() if meeting_doc.exists else {}
+    # Used by both the history viewer and Meeting Management below
+    current_meeting_id = meeting_data.get("meeting_id", "Not Set")
+    current_status = meeting_data.get("status", "Closed")
+
     # ======================================================
     # REGISTRATION REQUESTS
     # ======================================================
 
     st.subheader("Pending Registration Requests")
 
-    with st.spinner("Fetching registration requests..."):
-        requests = list(db.collection("registration_requests").stream())
+    requests = admin_reads["requests"]
 
     if not requests:
         st.info("No pending requests.")
     else:
+        if requests_cap is not None and len(requests) >= requests_cap:
+            st.caption(f"Showing the first {requests_cap} requests. Approve or reject these to see the rest.")
         for req in requests:
 
             data = req.to_dict()
@@ -1438,7 +3800,8 @@ elif menu == "Admin Panel":
                             default_password = mobile[-4:]
                             hashed_password = hash_password(default_password)
 
-                            db.collection("users").add({
+                            # The request ID doubles as the user ID, so approving twice creates one user
+                            create_once(db.collection("users").document(req_id), {
                                 "name": name,
                                 "father_name": father_name,
                                 "mobile": mobile,
@@ -1450,7 +3813,9 @@ elif menu == "Admin Panel":
                                 "created_at": datetime.utcnow()
                             })
 
-                            db.collection("registration_requests").document(req_id).delete()
+                            request_ref = db.collection("registration_requests").document(req_id)
+                            guarded("request_delete", lambda: request_ref.delete(**rpc("write")), kind="write")
+                            invalidate_user_directory()
 
                         st.success("User approved and created successfully.")
                         st.rerun()
@@ -1464,7 +3829,8 @@ elif menu == "Admin Panel":
 
                     try:
                         with st.spinner("Rejecting request..."):
-                            db.collection("registration_requests").document(req_id).delete()
+                            request_ref = db.collection("registration_requests").document(req_id)
+                            guarded("request_delete", lambda: request_ref.delete(**rpc("write")), kind="write")
 
                         st.warning("Request rejected.")
                         st.rerun()
@@ -1480,16 +3846,63 @@ elif menu == "Admin Panel":
 
     st.subheader("Registered Users")
 
-    with st.spinner("Loading users..."):
-        users = list(db.collection("users").stream())
+    user_directory = admin_reads["directory"]
+    user_search = st.text_input(
+        "Search by name, father name or mobile",
+        key="user_search"
+    ).strip()
+    users = user_directory.search(user_search)
+    st.caption(f"{len(users)} of {len(user_directory.users)} users")
+
+    # ================= BULK ACTIONS =================
+    with st.expander("Bulk Actions", expanded=False):
+        users_by_id = {u["id"]: u for u in users}
+        selected_ids = st.multiselect(
+            "Select users",
+            list(users_by_id),
+            format_func=lambda i: f"{users_by_id[i].get('name')} / {users_by_id[i].get('father_name')} ({users_by_id[i].get('mobile')})",
+            key="bulk_users"
+        )
+        bulk_action = st.radio("Action", BULK_ACTIONS, horizontal=True, key="bulk_action")
+
+        if st.button("Apply to Selected", disabled=not selected_ids):
+            selected_users = [users_by_id[i] for i in selected_ids]
+            total = len(selected_users)
+            progress = st.progress(0.0, text="Preparing updates...")
+
+            updates, errors = prepare_bulk_updates(
+                selected_users,
+                bulk_action,
+                lambda n: progress.progress(n / total / 2, text=f"Prepared {n} of {total}")
+            )
+            results = commit_user_updates(
+                updates,
+                lambda n: progress.progress(0.5 + n / total / 2, text=f"Saved {n} of {len(updates)}")
+            )
+            results.update({user_id: f"Failed: {err}" for user_id, err in errors.items()})
+            progress.progress(1.0, text="Done")
+            invalidate_user_directory()
+
+            ok_count = sum(1 for r in results.values() if r == "OK")
+            if ok_count == total:
+                st.success(f"{bulk_action} applied to {total} users.")
+            else:
+                st.warning(f"{bulk_action} applied to {ok_count} of {total} users.")
+
+            st.dataframe(pd.DataFrame([{
+                "Name": f"{users_by_id[i].get('name')} / {users_by_id[i].get('father_name')}",
+                "Mobile": users_by_id[i].get("mobile"),
+                "Result": results.get(i, "Skipped")
+            } for i in selected_ids]), use_container_width=True, hide_index=True)
 
     if not users:
         st.info("No users found.")
     else:
-        for user_doc in users:
+        users = render_list_pager(f"users_{user_search.lower()}", users)
 
-            user_data = user_doc.to_dict()
-            user_id = user_doc.id
+        for user_data in users:
+
+            user_id = user_data["id"]
             name = user_data.get("name")
             father_name = user_data.get("father_name")
             mobile = user_data.get("mobile")
@@ -1510,9 +3923,11 @@ elif menu == "Admin Panel":
                     key=f"block_{user_id}"
                 ):
                     try:
-                        db.collection("users").document(user_id).update({
+                        user_ref = db.collection("users").document(user_id)
+                        guarded("user_block", lambda: user_ref.update({
                             "is_blocked": not is_blocked
-                        })
+                        }, **rpc("write")), kind="write")
+                        invalidate_user_directory()
 
                         st.success("User status updated successfully.")
                         st.rerun()
@@ -1528,10 +3943,11 @@ elif menu == "Admin Panel":
                         default_password = mobile[-4:]
                         hashed_password = hash_password(default_password)
 
-                        db.collection("users").document(user_id).update({
+                        user_ref = db.collection("users").document(user_id)
+                        guarded("user_reset", lambda: user_ref.update({
                             "password_hash": hashed_password,
                             "must_change_password": True
-                        })
+                        }, **rpc("write")), kind="write")
 
                         st.success("Password reset to last 4 digits. User must change password on next login.")
 
@@ -1547,21 +3963,31 @@ elif menu == "Admin Panel":
     st.subheader("Meeting History Viewer")
 
     try:
-        # --- NEW: READ FROM THE MASTER LIST INSTEAD OF SCANNING EVERYTHING ---
-        master_list_docs = db.collection("meetings_history_list").stream()
-        
-        unique_meetings = set()
-        for doc in master_list_docs:
+        # --- READ ONE PAGE OF THE MASTER LIST, NEWEST FIRST ---
+        st.text_input("Search Meeting ID (prefix)", key="history_search")
+        history_docs = render_pager(history_key, admin_reads["history"])
+
+        history_rows = []
+        for doc in history_docs:
             record = doc.to_dict()
-            if "meeting_id" in record:
-                unique_meetings.add(str(record["meeting_id"]))
-                
-        # Sort them so the newest ones are usually at the top
-        meeting_list = sorted(list(unique_meetings), reverse=True)
+            if "meeting_id" not in record:
+                continue
+            created = record.get("created_at")
+            history_rows.append({
+                "Meeting ID": str(record["meeting_id"]),
+                "Created": format_ts(created),
+                "Status": record.get("status", "-"),
+                "Attendance": record.get("attendance_count", "-"),
+                "Votes": record.get("vote_count", "-"),
+            })
+
+        meeting_list = [row["Meeting ID"] for row in history_rows]
 
         if not meeting_list:
             st.info("No past meeting records found in the Master List yet. Create a new meeting to start tracking!")
         else:
+            st.dataframe(pd.DataFrame(history_rows), use_container_width=True, hide_index=True)
+
             selected_meeting = st.selectbox(
                 "Select a past meeting to view its data:", 
                 ["-- Select a Meeting --"] + meeting_list
@@ -1569,129 +3995,239 @@ elif menu == "Admin Panel":
 
             if selected_meeting != "-- Select a Meeting --":
                 st.markdown(f"### Data for Meeting: {selected_meeting}")
-                
-                # --- 1. ATTENDANCE DATA ---
-                # (Keep the rest of your attendance and voting code exactly the same below here!)
-                
-                # --- 1. ATTENDANCE DATA ---
-                st.subheader("1. Attendance Summary")
-                history_records = list(
-                    db.collection("attendance_details")
-                    .where("meeting_id", "==", selected_meeting)
-                    .stream()
-                )
-
-                if history_records:
-                    history_data = []
-                    h_yes_count = 0
-                    h_no_count = 0
-
-                    for doc in history_records:
-                        rec = doc.to_dict()
-                        h_status = rec.get("attending", "No")
-                        
-                        if h_status == "Yes":
-                            h_yes_count += 1
-                        else:
-                            h_no_count += 1
 
-                        h_submitted = rec.get("submitted_at")
-                        h_date_str = h_submitted.strftime("%Y-%m-%d %H:%M") if h_submitted else "N/A"
+                # --- FROZEN SNAPSHOT (written when the meeting was closed) ---
+                snap_ref = db.collection("meeting_snapshots").document(selected_meeting)
+                snap_doc = guarded(
+                    "history_snapshot", lambda: snap_ref.get(**rpc()), cache_key=f"snapshot:{selected_meeting}"
+                )
+                snapshot = snap_doc.to_dict() if snap_doc.exists else None
 
-                        history_data.append({
-                            "Name": rec.get("name", "").title(),
-                            "Date": h_date_str,
-                            "Attending": h_status,
-                            "Reason": rec.get("reason", "")
-                        })
+                if snapshot and snapshot.get("is_final"):
+                    closed_at = snapshot.get("closed_at")
+                    if closed_at:
+                        st.caption(f"Snapshot taken at close: {format_ts(closed_at)}")
 
+                    st.subheader("1. Attendance Summary")
                     hc1, hc2 = st.columns(2)
-                    hc1.metric("🟢 Attending (Yes)", h_yes_count)
-                    hc2.metric("🔴 Not Attending (No)", h_no_count)
+                    hc1.metric("🟢 Attending (Yes)", snapshot.get("attendance_yes", 0))
+                    hc2.metric("🔴 Not Attending (No)", snapshot.get("attendance_no", 0))
+
+                    attendees = snapshot.get("attendees", [])
+                    if attendees:
+                        st.dataframe(pd.DataFrame([{
+                            "Name": a.get("name", "").title(),
+                            "Attending": a.get("attending", "No"),
+                            "Reason": a.get("reason", "")
+                        } for a in attendees]), use_container_width=True, hide_index=True)
+
+                    st.divider()
+
+                    st.subheader("2. Voting Results")
+                    st.metric("Total Votes Submitted", snapshot.get("total_votes", 0))
+                    render_vote_charts(snapshot.get("vote_tallies", {}), {
+                        "agenda": "Agenda", "date": "Date", "time": "Time", "place": "Place"
+                    })
 
-                    import pandas as pd
-                    hdf = pd.DataFrame(history_data)
-                    st.dataframe(hdf, use_container_width=True, hide_index=True)
+                    show_raw = st.checkbox("Load raw attendance and vote records", key=f"raw_{selected_meeting}")
                 else:
-                    st.warning("No attendance records found for this meeting.")
+                    if selected_meeting != str(current_meeting_id) or current_status == "Closed":
+                        st.info("No snapshot for this meeting yet.")
+                        if st.button("Build Snapshot", key=f"snapshot_{selected_meeting}"):
+                            write_meeting_snapshot(selected_meeting)
+                            st.rerun()
+                    show_raw = True
+
+                if show_raw:
+
+                    # Closed meetings' raw records may have been moved by the archive job
+                    raw_archived = include_archived(f"raw_archived_{selected_meeting}")
+                    raw_reads = fetch_concurrently(
+                        attendance=lambda: live_and_archived(
+                            "attendance_details",
+                            lambda ref: ref.where("meeting_id", "==", selected_meeting).select(ATTENDANCE_FIELDS),
+                            include=raw_archived
+                        ),
+                        votes=lambda: live_and_archived(
+                            "meeting_details",
+                            lambda ref: ref.where("meeting_id", "==", selected_meeting).select(VOTE_TABLE_FIELDS),
+                            include=raw_archived
+                        ),
+                    )
 
-                st.divider()
+                    # --- 1. ATTENDANCE DATA ---
+                    st.subheader("Raw Attendance Records")
+                    history_records = raw_reads["attendance"]
 
-                # --- 2. VOTING DATA ---
-                st.subheader("2. Voting Results")
-                vote_records = list(
-                    db.collection("meeting_details")
-                    .where("meeting_id", "==", selected_meeting)
-                    .stream()
-                )
+                    if history_records:
+                        history_data = []
+                        h_yes_count = 0
+                        h_no_count = 0
 
-                if vote_records:
-                    agenda_count = {}
-                    date_count = {}
-                    time_count = {}
-                    place_count = {}
-                    vote_rows = []
+                        for doc in history_records:
+                            rec = doc.to_dict()
+                            h_status = rec.get("attending", "No")
 
-                    for vote in vote_records:
-                        data = vote.to_dict()
-                        vote_rows.append(data)
+                            if h_status == "Yes":
+                                h_yes_count += 1
+                            else:
+                                h_no_count += 1
 
-                        agenda = data.get("agenda") or "Not Specified"
-                        date_val = data.get("date") or "Not Specified"
-                        time_val = data.get("time") or "Not Specified"
-                        place = data.get("place") or "Not Specified"
+                            h_submitted = rec.get("submitted_at")
+                            h_date_str = format_ts(h_submitted)
 
-                        agenda_count[agenda] = agenda_count.get(agenda, 0) + 1
-                        date_count[date_val] = date_count.get(date_val, 0) + 1
-                        time_count[time_val] = time_count.get(time_val, 0) + 1
-                        place_count[place] = place_count.get(place, 0) + 1
+                            history_data.append({
+                                "Name": rec.get("name", "").title(),
+                                "Date": h_date_str,
+                                "Attending": h_status,
+                                "Reason": rec.get("reason", "")
+                            })
 
-                    st.metric("Total Votes Submitted", len(vote_records))
+                        hc1, hc2 = st.columns(2)
+                        hc1.metric("🟢 Attending (Yes)", h_yes_count)
+                        hc2.metric("🔴 Not Attending (No)", h_no_count)
 
-                    
+                        hdf = pd.DataFrame(history_data)
+                        st.dataframe(hdf, use_container_width=True, hide_index=True)
+                    else:
+                        st.warning("No attendance records found for this meeting.")
 
-                    def draw_pie(data_dict, title):
-                        if not data_dict:
-                            st.info(f"No data for {title}")
-                            return
-                        fig, ax = plt.subplots(figsize=(3,3))
-                        ax.pie(data_dict.values(), labels=data_dict.keys(), autopct="%1.1f%%", startangle=90)
-                        ax.set_title(title)
-                        st.pyplot(fig)
-                        plt.close(fig) 
-
-                    vc1, vc2 = st.columns(2)
-                    with vc1:
-                        draw_pie(agenda_count, "Agenda")
-                        draw_pie(date_count, "Date")
-                    with vc2:
-                        draw_pie(time_count, "Time")
-                        draw_pie(place_count, "Place")
-
-                    st.markdown("**Submitted Votes Table**")
-                    vdf = pd.DataFrame(vote_rows)
-                    st.dataframe(vdf, use_container_width=True, hide_index=True)
-                else:
-                    st.warning("No voting records found for this meeting.")
+                    st.divider()
+
+                    # --- 2. VOTING DATA ---
+                    st.subheader("Raw Voting Records")
+                    vote_records = raw_reads["votes"]
+
+                    if vote_records:
+                        vote_rows = [vote.to_dict() for vote in vote_records]
+
+                        st.metric("Total Votes Submitted", len(vote_records))
+                        render_vote_charts(tally_votes(vote_rows), {
+                            "agenda": "Agenda", "date": "Date", "time": "Time", "place": "Place"
+                        })
+
+                        st.markdown("**Submitted Votes Table**")
+                        vdf = pd.DataFrame(vote_rows)
+                        st.dataframe(vdf, use_container_width=True, hide_index=True)
+                    else:
+                        st.warning("No voting records found for this meeting.")
 
     except Exception as e:
         st.error(f"Failed to load meeting history: {e}")
     # ======================================================
-    # MEETING MANAGEMENT
+    # MEMBER PARTICIPATION LEADERBOARD
     # ======================================================
-    st.subheader("Meeting Management")
-
-    meeting_ref = db.collection("admin_settings").document("meeting_options")
+    st.divider()
+    st.subheader("Member Participation")
 
     try:
-        meeting_doc = meeting_ref.get()
-        meeting_data = meeting_doc.to_dict() if meeting_doc.exists else {}
+        leaders = guarded("leaderboard", lambda: list(
+            db.collection("member_stats")
+            .select(MEMBER_STATS_FIELDS)
+            .order_by("meetings_attended", direction=firestore.Query.DESCENDING)
+            .limit(25)
+            .stream(**rpc())
+        ), cache_key="leaderboard")
+
+        if leaders:
+            leader_rows = []
+            for doc in leaders:
+                item = doc.to_dict()
+                attended = item.get("meetings_attended", 0)
+                declined = item.get("meetings_declined", 0)
+                responses = attended + declined
+                last_seen = item.get("last_seen")
+                leader_rows.append({
+                    "Name": item.get("name", "").title(),
+                    "Attended": attended,
+                    "Declined": declined,
+                    "Voted": item.get("meetings_voted", 0),
+                    "Yes Rate (of Responses)": f"{attended / responses:.0%}" if responses else "-",
+                    "Last Seen": format_ts(last_seen, "%Y-%m-%d")
+                })
+            st.dataframe(pd.DataFrame(leader_rows), use_container_width=True, hide_index=True)
+        else:
+            st.info("No member stats yet. Run the backfill to build them from past meetings.")
+
+        if st.button("Rebuild Member Stats"):
+            with st.spinner("Rebuilding member stats from attendance and votes..."):
+                rebuilt = backfill_member_stats()
+            st.success(f"Member stats rebuilt for {rebuilt} members.")
+            st.rerun()
+
     except Exception as e:
-        st.error(f"Error loading meeting settings: {e}")
-        st.stop()
+        st.error(f"Failed to load member stats: {e}")
 
-    current_meeting_id = meeting_data.get("meeting_id", "Not Set")
-    current_status = meeting_data.get("status", "Closed")
+    # ======================================================
+    # TRENDING SCORES
+    # ======================================================
+    st.divider()
+    st.subheader("Trending Scores")
+    st.caption(
+        "Scores are updated as likes arrive. After imports, or to backfill older items, "
+        "run `python jobs.py recompute-trending` outside the app."
+    )
+
+    # ======================================================
+    # DIAGNOSTICS
+    # ======================================================
+    st.divider()
+    with st.expander("Diagnostics", expanded=False):
+        policy = get_call_policy()
+        st.markdown(f"**Firestore circuit breaker:** {policy.breaker_state()}")
+        st.dataframe(
+            pd.DataFrame([policy.counters]),
+            use_container_width=True,
+            hide_index=True
+        )
+        latency_rows = policy.percentiles()
+        if latency_rows:
+            st.dataframe(pd.DataFrame(latency_rows), use_container_width=True, hide_index=True)
+
+        write_behind = get_write_behind()
+        if write_behind is not None:
+            st.markdown(
+                f"**Write-behind:** {write_behind.flushed} groups flushed, "
+                f"{write_behind.retries} retries, {write_behind.duplicates} duplicate submits dropped, "
+                f"{len(write_behind.failed)} failed"
+            )
+
+        st.markdown(f"**Read budget:** {budget.used} of {budget.limit} documents used on this page so far")
+        budget_log = list(get_budget_log())
+        if budget_log:
+            st.markdown("**Recent read-budget overruns:**")
+            st.dataframe(pd.DataFrame(budget_log[::-1]), use_container_width=True, hide_index=True)
+
+        warmer = get_cache_warmer(tenant)
+        if warmer is not None:
+            warm_state = f"finished {format_ts(warmer.finished_at)}" if warmer.finished_at else "running"
+            st.markdown(f"**Startup cache warm-up:** {warm_state} (started {format_ts(warmer.started_at)})")
+            st.caption(
+                "The warm-up only primes the Firestore connection, the outage (stale) copies and the "
+                "chart cache. Pages still read live data on every run."
+            )
+            st.dataframe(pd.DataFrame(warmer.snapshot()), use_container_width=True, hide_index=True)
+
+        replica = get_replica(tenant)
+        if replica is not None:
+            st.markdown("**Local replica watermarks:**")
+            st.caption(f"Collections not heard from within {replica.max_lag:.0f}s are read from Firestore instead.")
+            replica_rows_info = []
+            for c in REPLICA_COLLECTIONS:
+                lag = replica.lag(c)
+                replica_rows_info.append({
+                    "Collection": c,
+                    "Last Change": format_ts(replica.watermarks.get(c)),
+                    "Heard From (s ago)": None if lag is None else round(lag, 1),
+                    "Serving": "Yes" if replica.is_fresh(c) else "No",
+                    "Error": replica.errors.get(c, "")
+                })
+            st.dataframe(pd.DataFrame(replica_rows_info), use_container_width=True, hide_index=True)
+
+    # ======================================================
+    # MEETING MANAGEMENT
+    # ======================================================
+    st.subheader("Meeting Management")
 
     col1, col2 = st.columns(2)
     col1.info(f"Meeting ID: {current_meeting_id}")
@@ -1716,16 +4252,23 @@ elif menu == "Admin Panel":
                 st.error("Meeting ID required.")
             else:
                 try:
+                    # The history entry is created first: its create() fails for any ID
+                    # used before, even once that meeting's records have been archived
+                    history_ref = db.collection("meetings_history_list").document(clean_id)
                     with st.spinner("Checking for duplicate IDs..."):
-                        # Look for this ID in past attendance or past votes
-                        past_attendance = list(db.collection("attendance_details").where("meeting_id", "==", clean_id).limit(1).stream())
-                        past_votes = list(db.collection("meeting_details").where("meeting_id", "==", clean_id).limit(1).stream())
-                        
-                    if past_attendance or past_votes or (current_meeting_id == clean_id):
+                        is_new = current_meeting_id != clean_id and create_once(history_ref, {
+                            "meeting_id": clean_id,
+                            "created_at": datetime.utcnow(),
+                            "status": "Active",
+                            "attendance_count": 0,
+                            "vote_count": 0
+                        })
+
+                    if not is_new:
                         st.error(f"Meeting ID '{clean_id}' has already been used! Please choose a unique ID.")
                     else:
                         # --- SAFE TO CREATE ---
-                        meeting_ref.set({
+                        guarded("meeting_activate", lambda: meeting_ref.set({
                             "meeting_id": clean_id,
                             "agenda_options": [x.strip() for x in agenda_input.split(",") if x.strip()],
                             "date_options": [x.strip() for x in date_input.split(",") if x.strip()],
@@ -1733,13 +4276,7 @@ elif menu == "Admin Panel":
                             "place_options": [x.strip() for x in place_input.split(",") if x.strip()],
                             "status": "Active",
                             "created_at": datetime.utcnow()
-                        })
-
-                        # --- NEW: SAVE TO MASTER LIST (Metadata Collection) ---
-                        db.collection("meetings_history_list").document(clean_id).set({
-                            "meeting_id": clean_id,
-                            "created_at": datetime.utcnow()
-                        })
+                        }, **rpc("write")), kind="write")
 
                         st.success(f"Meeting {clean_id} activated successfully.")
                         st.rerun()
@@ -1752,7 +4289,9 @@ elif menu == "Admin Panel":
         st.divider()
         if st.button("Close Meeting"):
             try:
-                meeting_ref.update({"status": "Closed"})
+                with st.spinner("Saving meeting snapshot..."):
+                    guarded("meeting_close", lambda: meeting_ref.update({"status": "Closed"}, **rpc("write")), kind="write")
+                    write_meeting_snapshot(current_meeting_id)
                 st.success("Meeting closed successfully.")
                 st.rerun()
 
@@ -1764,7 +4303,10 @@ elif menu == "Admin Panel":
         if st.button("Reactivate Current Meeting"):
             try:
                 # Flips status back to Active without erasing data
-                meeting_ref.update({"status": "Active"})
+                restore_archived_meeting(current_meeting_id)
+                guarded("meeting_reactivate", lambda: meeting_ref.update({"status": "Active"}, **rpc("write")), kind="write")
+                invalidate_meeting_snapshot(current_meeting_id)
+                update_history_entry(current_meeting_id, {"status": "Active"})
                 st.success(f"Meeting {current_meeting_id} reactivated successfully.")
                 st.rerun()
 
@@ -1782,3 +4324,7 @@ elif menu == "Logout":
     st.success("Logged out successfully.")
 
     st.rerun()
+
+# ---------------- PROFILE REPORT ----------------
+if profiler is not None:
+    finish_profiler(profiler)
@@ -0,0 +1,874 @@
+"""Offline maintenance jobs for the Volunteer Portal's Firestore data.
+
+Runs outside Streamlit with its own Firestore client:
+
+    # against the emulator
+    export FIRESTORE_EMULATOR_HOST=localhost:8080
+    python jobs.py migrate-timestamps --dry-run
+
+    # against the real project (service account JSON or application default credentials)
+    python jobs.py --credentials service-account.json migrate-timestamps --source-tz Asia/Kolkata
+
+    # recompute denormalised counters and summaries, report drift and fix it
+    python jobs.py reconcile --dry-run
+    python jobs.py reconcile --only likes member-stats
+
+    # rebuild trending scores from creation and like times (after imports, or
+    # when TREND_EPOCH moves forward)
+    python jobs.py recompute-trending --source-tz Asia/Kolkata
+
+    # move old records and closed meetings out of the live collections
+    python jobs.py archive --dry-run
+    python jobs.py archive --to jsonl --archive-dir archives/ --months 6
+
+--to jsonl keeps only small stubs of attendance, vote and team records in
+archive_* (enough for reconcile and the app's counts); archived notices,
+complaints and suggestions are then off Firestore entirely, and the app's
+"Include archived" toggle cannot show them.
+
+    # one chapter of a multi-chapter deployment (collections under chapters/<id>/)
+    python jobs.py --tenant pune reconcile
+
+Jobs page through collections ordered by document name. Per-document jobs
+record the last document they finished in a JSON checkpoint file, so an
+interrupted run picks up where it stopped when started again with the same
+checkpoint; aggregate summaries are recomputed in full on every run. Counter
+corrections are written as increments of the difference, so the app can keep
+writing while a job runs.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore
+
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_WORKERS = 8
+BATCH_LIMIT = 400  # Firestore allows 500 writes per batch; keep headroom
+RECENT_LIKERS = 5  # same preview length as app.py
+DRIFT_SAMPLES = 10
+ARCHIVE_PREFIX = "archive_"  # same prefix app.py reads with "Include archived"
+TENANT_ROOT = "chapters"  # same layout as app.py
+DEFAULT_TENANT = "default"
+LEGACY_TS_FORMAT = "%Y-%m-%d %H:%M"
+
+# (label, collection, is collection group, field) written as local-time strings by older builds
+TIMESTAMP_TARGETS = [
+    ("notices.posted_at", "notices", False, "posted_at"),
+    ("funds_received.date_time", "funds_received", False, "date_time"),
+    ("funds_spent.date_time", "funds_spent", False, "date_time"),
+    ("teams.created_at", "teams", False, "created_at"),
+    ("likes.liked_at", "likes", True, "liked_at"),  # collection group: every chapter at once
+]
+
+
+# ---------------- CLIENT ----------------
+
+def make_client(credentials_path=None, project=None):
+    project = project or os.environ.get("GOOGLE_CLOUD_PROJECT")
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        return firestore.Client(project=project or "volunteers-local", credentials=AnonymousCredentials())
+    if credentials_path:
+        return firestore.Client.from_service_account_json(credentials_path, project=project)
+    return firestore.Client(project=project)
+
+
+class TenantClient:
+    # collection() is scoped to the chapter; batch(), document(), collection_group() use the whole database
+    def __init__(self, client, tenant):
+        self._client = client
+        self._root = client if tenant == DEFAULT_TENANT else client.collection(TENANT_ROOT).document(tenant)
+
+    def collection(self, name):
+        return self._root.collection(name)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+# ---------------- CHECKPOINTS ----------------
+
+class Checkpoint:
+    # {job: {label: {"cursor": doc path, "done": bool, ...counters}}} persisted after every page
+    def __init__(self, path, job, enabled=True):
+        self.path = path
+        self.job = job
+        self.enabled = enabled
+        self.data = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as fh:
+                self.data = json.load(fh)
+
+    def get(self, label):
+        with self._lock:
+            return self.data.setdefault(self.job, {}).setdefault(label, {"cursor": None, "done": False})
+
+    def save(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as fh:
+                json.dump(self.data, fh, indent=2, default=str)
+            os.replace(tmp, self.path)
+
+    def clear(self):
+        # Recurring jobs start from the beginning again once a full pass has finished
+        with self._lock:
+            self.data.pop(self.job, None)
+        self.save()
+
+
+def iter_pages(db, collection, is_group, fields, page_size, cursor_path=None):
+    # Yields pages of snapshots in document-name order, starting after cursor_path
+    base = db.collection_group(collection) if is_group else db.collection(collection)
+    cursor = db.document(cursor_path) if cursor_path else None
+
+    while True:
+        query = base.select(fields).order_by("__name__").limit(page_size)
+        if cursor is not None:
+            query = query.start_after([cursor])
+        page = list(query.stream())
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        cursor = page[-1].reference
+
+
+def make_bulk_writer(db, failures):
+    writer = db.bulk_writer()
+
+    def on_error(error, _writer):
+        # Called as callback(BulkWriteFailure, BulkWriter). Retry transient failures
+        # a few times, then record the document and move on
+        if error.attempts < 5:
+            return True
+        failures[error.operation.reference.path] = error.message
+        return False
+
+    writer.on_write_error(on_error)
+    return writer
+
+
+class BatchedWrites:
+    # Collects corrections into WriteBatches of BATCH_LIMIT; a no-op in dry-run mode
+    def __init__(self, db, dry_run):
+        self.db = db
+        self.dry_run = dry_run
+        self.batch = db.batch()
+        self.pending = 0
+        self.written = 0
+
+    def add(self, method, ref, data=None, **kwargs):
+        if self.dry_run:
+            return
+        args = (ref,) if method == "delete" else (ref, data)
+        getattr(self.batch, method)(*args, **kwargs)
+        self.pending += 1
+        if self.pending == BATCH_LIMIT:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.batch.commit()
+            self.written += self.pending
+            self.batch = self.db.batch()
+            self.pending = 0
+
+
+# ---------------- MIGRATE TIMESTAMPS ----------------
+
+def parse_legacy_ts(value, source_tz):
+    # "%Y-%m-%d %H:%M" in source_tz -> aware UTC datetime; None if it does not parse
+    try:
+        local = datetime.strptime(value.strip(), LEGACY_TS_FORMAT)
+    except ValueError:
+        return None
+    return local.replace(tzinfo=source_tz).astimezone(timezone.utc)
+
+
+def migrate_timestamps(db, checkpoint, source_tz, page_size, dry_run):
+    report = {}
+
+    for label, collection, is_group, field in TIMESTAMP_TARGETS:
+        state = checkpoint.get(label)
+        if state["done"]:
+            print(f"{label}: already migrated, skipping")
+            report[label] = state
+            continue
+
+        failures = {}
+        writer = None if dry_run else make_bulk_writer(db, failures)
+        state.setdefault("scanned", 0)
+        state.setdefault("converted", 0)
+        state.setdefault("unparseable", [])
+
+        def convert(doc):
+            value = (doc.to_dict() or {}).get(field)
+            if not isinstance(value, str):
+                return  # already a timestamp, or the field is missing
+            converted = parse_legacy_ts(value, source_tz)
+            if converted is None:
+                state["unparseable"].append(f"{doc.reference.path}: {value!r}")
+                return
+            if writer is not None:
+                writer.update(doc.reference, {field: converted})
+            state["converted"] += 1
+
+        # Writes that failed on an earlier run sit behind the cursor: retry them first
+        retry = list(state.get("failed") or {})
+        if retry:
+            for doc in db.get_all([db.document(path) for path in retry], field_paths=[field]):
+                convert(doc)
+            if writer is not None:
+                writer.flush()
+            print(f"{label}: retried {len(retry)} failed writes", flush=True)
+
+        for page in iter_pages(db, collection, is_group, [field], page_size, state["cursor"]):
+            for doc in page:
+                convert(doc)
+
+            # Only advance the checkpoint once the page's writes are acknowledged;
+            # documents that still failed are kept in state["failed"] for the next run
+            if writer is not None:
+                writer.flush()
+            state["scanned"] += len(page)
+            state["cursor"] = page[-1].reference.path
+            state["failed"] = dict(failures)
+            checkpoint.save()
+            print(f"{label}: scanned {state['scanned']}, converted {state['converted']}", flush=True)
+
+        if writer is not None:
+            writer.close()
+        state["failed"] = dict(failures)
+        state["done"] = not failures
+        checkpoint.save()
+        report[label] = state
+
+    return report
+
+
+def print_migration_report(report, dry_run):
+    verb = "would convert" if dry_run else "converted"
+    print()
+    for label, state in report.items():
+        print(f"{label:<28} scanned {state.get('scanned', 0):>7}   {verb} {state.get('converted', 0):>7}")
+        for entry in state.get("unparseable", [])[:5]:
+            print(f"    unparseable  {entry}")
+        for path, message in list((state.get("failed") or {}).items())[:5]:
+            print(f"    failed       {path}: {message}")
+
+
+# ---------------- RECONCILE ----------------
+
+LIKED_COLLECTIONS = ["notices", "complaints", "suggestions"]
+RECONCILE_TARGETS = ["likes", "member-stats", "team-summaries", "history-counts"]
+
+
+class DriftReport:
+    def __init__(self, label):
+        self.label = label
+        self.scanned = 0
+        self.drifted = 0
+        self.samples = []
+
+    def record(self, path, stored, actual):
+        self.drifted += 1
+        if len(self.samples) < DRIFT_SAMPLES:
+            self.samples.append({"doc": path, "stored": stored, "actual": actual})
+
+    def as_dict(self, written):
+        return {"scanned": self.scanned, "drifted": self.drifted, "corrected": written, "samples": self.samples}
+
+
+def diff_fields(stored, actual):
+    # Only the fields whose stored value differs from the recomputed one
+    return {key: value for key, value in actual.items() if stored.get(key) != value}
+
+
+def counter_fix(stored, fix):
+    # Counters are corrected by the difference, so increments the app makes
+    # while the job runs are kept rather than overwritten
+    return {key: firestore.Increment(value - (stored.get(key) or 0)) for key, value in fix.items()}
+
+
+def stream_all(db, collection, fields, page_size, with_archive=False):
+    # with_archive also counts records the archive job moved to archive_<collection>
+    collections = [collection, ARCHIVE_PREFIX + collection] if with_archive else [collection]
+    for name in collections:
+        for page in iter_pages(db, name, False, fields, page_size):
+            for doc in page:
+                yield doc
+
+
+def actual_likes(doc_ref):
+    likes = doc_ref.collection("likes")
+    count = likes.count().get()[0][0].value
+
+    recent = []
+    recent_query = likes.select(["name"]) \
+        .order_by("liked_at", direction=firestore.Query.DESCENDING) \
+        .limit(RECENT_LIKERS * 2)
+    for like in recent_query.stream():
+        name = like.to_dict().get("name")
+        if name and name not in recent:
+            recent.append(name)
+    return {"likes": int(count), "recent_likers": recent[:RECENT_LIKERS]}
+
+
+def reconcile_likes(db, collection, checkpoint, page_size, workers, dry_run):
+    # likes and recent_likers on every item, recomputed from its likes subcollection
+    report = DriftReport(f"{collection}.likes")
+    writes = BatchedWrites(db, dry_run)
+    state = checkpoint.get(collection)
+    if state["done"]:
+        # Finished on a run where another target failed: start a fresh pass
+        state.update(cursor=None, done=False)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for page in iter_pages(db, collection, False, ["likes", "recent_likers"], page_size, state["cursor"]):
+            actuals = pool.map(lambda doc: actual_likes(doc.reference), page)
+            for doc, actual in zip(page, actuals):
+                stored = doc.to_dict() or {}
+                fix = diff_fields({"likes": stored.get("likes", 0), "recent_likers": stored.get("recent_likers", [])}, actual)
+                if fix:
+                    report.record(doc.reference.path, {k: stored.get(k) for k in fix}, fix)
+                    # recent_likers is a preview and is simply replaced
+                    correction = dict(fix)
+                    if "likes" in fix:
+                        correction.update(counter_fix(stored, {"likes": fix["likes"]}))
+                    writes.add("update", doc.reference, correction)
+            writes.flush()
+            report.scanned += len(page)
+            state["cursor"] = page[-1].reference.path
+            checkpoint.save()
+
+    state["done"] = True
+    checkpoint.save()
+    return report.as_dict(writes.written)
+
+
+def reconcile_member_stats(db, page_size, dry_run):
+    actual = {}
+
+    def entry(user_id, name):
+        return actual.setdefault(str(user_id), {
+            "user_id": user_id,
+            "name": name,
+            "meetings_attended": 0,
+            "meetings_declined": 0,
+            "meetings_voted": 0,
+        })
+
+    for doc in stream_all(db, "attendance_details", ["user_id", "name", "attending"], page_size, with_archive=True):
+        rec = doc.to_dict()
+        if not rec.get("user_id"):
+            continue
+        item = entry(rec["user_id"], rec.get("name", ""))
+        item["meetings_attended" if rec.get("attending") == "Yes" else "meetings_declined"] += 1
+
+    for doc in stream_all(db, "meeting_details", ["user_id", "name_father"], page_size, with_archive=True):
+        rec = doc.to_dict()
+        if not rec.get("user_id"):
+            continue
+        entry(rec["user_id"], rec.get("name_father", ""))["meetings_voted"] += 1
+
+    report = DriftReport("member_stats")
+    writes = BatchedWrites(db, dry_run)
+    counters = ["meetings_attended", "meetings_declined", "meetings_voted"]
+    stats_ref = db.collection("member_stats")
+
+    for doc in stream_all(db, "member_stats", counters, page_size):
+        report.scanned += 1
+        stored = doc.to_dict() or {}
+        item = actual.pop(doc.id, None)
+        expected = {key: item[key] if item else 0 for key in counters}
+        fix = diff_fields({key: stored.get(key, 0) for key in counters}, expected)
+        if fix:
+            report.record(doc.reference.path, {k: stored.get(k, 0) for k in fix}, fix)
+            writes.add("set", doc.reference, counter_fix(stored, fix), merge=True)
+
+    # Members with records but no stats document at all (one may be created meanwhile)
+    for doc_id, item in actual.items():
+        report.record(f"member_stats/{doc_id}", None, item)
+        fix = dict(item, **counter_fix({}, {key: item[key] for key in counters}))
+        writes.add("set", stats_ref.document(doc_id), fix, merge=True)
+
+    writes.flush()
+    return report.as_dict(writes.written)
+
+
+def reconcile_team_summaries(db, page_size, dry_run):
+    actual = {}
+    for doc in stream_all(db, "teams", ["team", "name", "created_at"], page_size, with_archive=True):
+        rec = doc.to_dict()
+        team = rec.get("team")
+        if not team:
+            continue
+        summary = actual.setdefault(team, {"team": team, "entry_count": 0, "members": {}, "last_activity": None})
+        summary["entry_count"] += 1
+        member = rec.get("name", "")
+        summary["members"][member] = summary["members"].get(member, 0) + 1
+        created_at = rec.get("created_at")
+        # Unmigrated string timestamps cannot be compared with native ones
+        if isinstance(created_at, datetime) and (summary["last_activity"] is None or created_at > summary["last_activity"]):
+            summary["last_activity"] = created_at
+
+    report = DriftReport("team_summaries")
+    writes = BatchedWrites(db, dry_run)
+    summaries_ref = db.collection("team_summaries")
+    stored_summaries = {
+        doc.id: doc.to_dict() or {}
+        for doc in stream_all(db, "team_summaries", ["entry_count", "members", "last_activity"], page_size)
+    }
+    report.scanned = len(stored_summaries)
+
+    for team, summary in actual.items():
+        stored = stored_summaries.get(team, {})
+        fix = diff_fields(stored, {"entry_count": summary["entry_count"], "members": summary["members"]})
+        if fix:
+            report.record(f"team_summaries/{team}", {k: stored.get(k) for k in fix}, fix)
+            stored_members = stored.get("members") or {}
+            # Per-member increments; members with no entries left drop out of the map
+            members = counter_fix(stored_members, diff_fields(stored_members, summary["members"]))
+            members.update({name: firestore.DELETE_FIELD for name in stored_members if name not in summary["members"]})
+            correction = {"team": team, "members": members}
+            correction.update(counter_fix(stored, {"entry_count": summary["entry_count"]}))
+            last_activity = stored.get("last_activity")
+            if summary["last_activity"] and not (isinstance(last_activity, datetime) and last_activity >= summary["last_activity"]):
+                correction["last_activity"] = summary["last_activity"]
+            writes.add("set", summaries_ref.document(team), correction, merge=True)
+
+    writes.flush()
+    return report.as_dict(writes.written)
+
+
+def reconcile_history_counts(db, page_size, dry_run):
+    attendance = {}
+    votes = {}
+    for doc in stream_all(db, "attendance_details", ["meeting_id"], page_size, with_archive=True):
+        meeting_id = str(doc.to_dict().get("meeting_id"))
+        attendance[meeting_id] = attendance.get(meeting_id, 0) + 1
+    for doc in stream_all(db, "meeting_details", ["meeting_id"], page_size, with_archive=True):
+        meeting_id = str(doc.to_dict().get("meeting_id"))
+        votes[meeting_id] = votes.get(meeting_id, 0) + 1
+
+    report = DriftReport("meetings_history_list")
+    writes = BatchedWrites(db, dry_run)
+
+    for doc in stream_all(db, "meetings_history_list", ["attendance_count", "vote_count"], page_size):
+        report.scanned += 1
+        stored = doc.to_dict() or {}
+        fix = diff_fields(stored, {"attendance_count": attendance.get(doc.id, 0), "vote_count": votes.get(doc.id, 0)})
+        if fix:
+            report.record(doc.reference.path, {k: stored.get(k) for k in fix}, fix)
+            writes.add("update", doc.reference, counter_fix(stored, fix))
+
+    writes.flush()
+    return report.as_dict(writes.written)
+
+
+def reconcile(db, checkpoint, targets, page_size, workers, dry_run):
+    # Every collection is reconciled by its own worker; likes fan out further per document
+    tasks = {}
+    with ThreadPoolExecutor(max_workers=len(LIKED_COLLECTIONS) + 3) as pool:
+        if "likes" in targets:
+            for collection in LIKED_COLLECTIONS:
+                tasks[f"{collection}.likes"] = pool.submit(
+                    reconcile_likes, db, collection, checkpoint, page_size, workers, dry_run
+                )
+        if "member-stats" in targets:
+            tasks["member_stats"] = pool.submit(reconcile_member_stats, db, page_size, dry_run)
+        if "team-summaries" in targets:
+            tasks["team_summaries"] = pool.submit(reconcile_team_summaries, db, page_size, dry_run)
+        if "history-counts" in targets:
+            tasks["meetings_history_list"] = pool.submit(reconcile_history_counts, db, page_size, dry_run)
+
+    report = {}
+    for label, future in tasks.items():
+        try:
+            report[label] = future.result()
+        except Exception as e:
+            report[label] = {"error": str(e)}
+
+    if not any("error" in entry for entry in report.values()):
+        checkpoint.clear()
+    return report
+
+
+def print_reconcile_report(report, dry_run):
+    verb = "would fix" if dry_run else "corrected"
+    print()
+    for label, entry in report.items():
+        if "error" in entry:
+            print(f"{label:<28} FAILED: {entry['error']}")
+            continue
+        print(f"{label:<28} scanned {entry['scanned']:>7}   drifted {entry['drifted']:>6}   "
+              f"{verb} {entry['drifted'] if dry_run else entry['corrected']:>6}")
+        for sample in entry["samples"][:5]:
+            print(f"    {sample['doc']}: {sample['stored']} -> {sample['actual']}")
+
+
+# ---------------- TRENDING ----------------
+
+# Same scoring as app.py: every event (creation + each like) adds
+# 2 ** ((t - TREND_EPOCH) / half-life) to the item's trend_score
+TREND_EPOCH = datetime(2026, 1, 1)
+TREND_HALF_LIFE_HOURS = 24 * 7
+TREND_TARGETS = {"notices": "posted_at", "complaints": "created_at", "suggestions": "created_at"}
+
+
+def trend_weight(event_time, source_tz):
+    # Legacy strings are read in source_tz; a missing or unreadable time counts as now, as in app.py
+    if isinstance(event_time, str):
+        event_time = parse_legacy_ts(event_time, source_tz)
+    if not isinstance(event_time, datetime):
+        event_time = datetime.now(timezone.utc)
+    if event_time.tzinfo is not None:
+        event_time = event_time.astimezone(timezone.utc).replace(tzinfo=None)
+    hours = (event_time - TREND_EPOCH).total_seconds() / 3600
+    return 2 ** (hours / TREND_HALF_LIFE_HOURS)
+
+
+def actual_trend_score(doc, field, source_tz):
+    score = trend_weight((doc.to_dict() or {}).get(field), source_tz)
+    for like in doc.reference.collection("likes").select(["liked_at"]).stream():
+        score += trend_weight(like.to_dict().get("liked_at"), source_tz)
+    return score
+
+
+def recompute_trend_scores(db, collection, field, checkpoint, source_tz, page_size, workers, dry_run):
+    # Live items and archived ones; likes are read in parallel, a page at a time
+    writes = BatchedWrites(db, dry_run)
+    report = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for name in (collection, ARCHIVE_PREFIX + collection):
+            state = checkpoint.get(name)
+            state.setdefault("scanned", 0)
+            if state["done"]:
+                print(f"{name}: already recomputed, skipping")
+                report[name] = state["scanned"]
+                continue
+
+            for page in iter_pages(db, name, False, [field, "trend_score"], page_size, state["cursor"]):
+                scores = pool.map(lambda doc: actual_trend_score(doc, field, source_tz), page)
+                for doc, score in zip(page, scores):
+                    # Corrected by the difference, so likes that land meanwhile keep their increment
+                    stored = (doc.to_dict() or {}).get("trend_score", 0)
+                    writes.add("update", doc.reference, {"trend_score": firestore.Increment(score - stored)})
+                writes.flush()
+                state["scanned"] += len(page)
+                state["cursor"] = page[-1].reference.path
+                checkpoint.save()
+                print(f"{name}: recomputed {state['scanned']}", flush=True)
+
+            state["done"] = True
+            checkpoint.save()
+            report[name] = state["scanned"]
+
+    return report
+
+
+def recompute_trending(db, checkpoint, source_tz, page_size, workers, dry_run):
+    report = {}
+    for collection, field in TREND_TARGETS.items():
+        report.update(recompute_trend_scores(db, collection, field, checkpoint, source_tz, page_size, workers, dry_run))
+    checkpoint.clear()
+    return report
+
+
+def print_trending_report(report, dry_run):
+    verb = "would recompute" if dry_run else "recomputed"
+    print()
+    for name, scanned in report.items():
+        print(f"{name:<28} {verb} {scanned:>7}")
+
+
+# ---------------- ARCHIVE ----------------
+
+# collection -> (age field, default retention in months); None keeps records until their meeting closes
+RETENTION_POLICY = {
+    "notices": ("posted_at", 12),
+    "teams": ("created_at", 12),
+    "complaints": ("created_at", 24),
+    "suggestions": ("created_at", 24),
+    "attendance_details": (None, None),
+    "meeting_details": (None, None),
+}
+# Items whose likes subcollection moves with them
+ARCHIVE_WITH_LIKES = {"notices", "complaints", "suggestions"}
+# --to jsonl leaves a stub with these fields in archive_<collection>, so reconcile and the
+# app's rebuilds (member stats, team summaries, history counts, snapshots) keep counting
+# the record. Other collections leave nothing behind: "Include archived" cannot show them
+JSONL_STUB_FIELDS = {
+    "attendance_details": ["meeting_id", "user_id", "name", "attending", "submitted_at"],
+    "meeting_details": ["meeting_id", "user_id", "name_father", "agenda", "date", "time", "place", "voted_at"],
+    "teams": ["team", "name", "created_at"],
+}
+COLD_ARCHIVE_FIELD = "cold_archive"  # same field app.py checks for stubs
+
+
+def to_json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class FirestoreArchive:
+    # Copies each record (and its likes) to archive_<collection>, then deletes the original
+    def __init__(self, db, dry_run):
+        self.db = db
+        self.writes = BatchedWrites(db, dry_run)
+
+    def move(self, collection, doc, likes):
+        target = self.db.collection(ARCHIVE_PREFIX + collection).document(doc.id)
+        # Copies are queued before deletes, so an interrupted run never loses data
+        for like in likes:
+            self.writes.add("set", target.collection("likes").document(like.id), like.to_dict())
+            self.writes.add("delete", like.reference)
+        self.writes.add("set", target, doc.to_dict())
+        self.writes.add("delete", doc.reference)
+
+    def end_page(self):
+        self.writes.flush()
+
+    def close(self):
+        self.writes.flush()
+
+
+class JsonlArchive:
+    # Appends records to archive_dir/<collection>-<run>.jsonl.gz, deleting originals once a page is on disk
+    def __init__(self, db, archive_dir, dry_run):
+        self.db = db
+        self.archive_dir = archive_dir
+        self.dry_run = dry_run
+        self.run_id = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+        self.files = {}
+        self.writes = BatchedWrites(db, dry_run)
+        self.stubs = []
+        self.deletes = []
+
+    def _path(self, collection):
+        return os.path.join(self.archive_dir, f"{collection}-{self.run_id}.jsonl.gz")
+
+    def _file(self, collection):
+        if collection not in self.files:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            self.files[collection] = gzip.open(self._path(collection), "at", encoding="utf-8")
+        return self.files[collection]
+
+    def move(self, collection, doc, likes):
+        if self.dry_run:
+            return
+        record = {
+            "collection": collection,
+            "id": doc.id,
+            "data": doc.to_dict(),
+            "likes": [{"id": like.id, "data": like.to_dict()} for like in likes],
+        }
+        self._file(collection).write(json.dumps(record, default=to_json_value) + "\n")
+        if collection in JSONL_STUB_FIELDS:
+            data = record["data"]
+            stub = {field: data[field] for field in JSONL_STUB_FIELDS[collection] if field in data}
+            stub[COLD_ARCHIVE_FIELD] = os.path.basename(self._path(collection))
+            self.stubs.append((self.db.collection(ARCHIVE_PREFIX + collection).document(doc.id), stub))
+        self.deletes += [like.reference for like in likes] + [doc.reference]
+
+    def end_page(self):
+        for fh in self.files.values():
+            fh.flush()
+        # Stubs are queued before deletes, as FirestoreArchive does with its copies
+        for ref, stub in self.stubs:
+            self.writes.add("set", ref, stub)
+        for ref in self.deletes:
+            self.writes.add("delete", ref)
+        self.writes.flush()
+        self.stubs = []
+        self.deletes = []
+
+    def close(self):
+        self.end_page()
+        for fh in self.files.values():
+            fh.close()
+
+
+def iter_query_pages(query, page_size):
+    cursor = None
+    while True:
+        page_query = query.order_by("__name__").limit(page_size)
+        if cursor is not None:
+            page_query = page_query.start_after(cursor)
+        page = list(page_query.stream())
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        cursor = page[-1]
+
+
+def archive_candidates(db, collection, field, cutoff, page_size):
+    # Oldest first; the cursor keeps skipped records (e.g. pinned notices) from being re-read
+    cursor = None
+    while True:
+        query = db.collection(collection).where(field, "<", cutoff).order_by(field).limit(page_size)
+        if cursor is not None:
+            query = query.start_after(cursor)
+        page = list(query.stream())
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        cursor = page[-1]
+
+
+def closed_meeting_ids(db):
+    # Only meetings with a final snapshot; the history viewer reads that instead of the raw records.
+    # The meeting named in meeting_options is never archived: the admin can still reactivate it
+    settings = db.collection("admin_settings").document("meeting_options").get()
+    current = settings.to_dict().get("meeting_id") if settings.exists else None
+    closed = []
+    for doc in db.collection("meetings_history_list").where("status", "==", "Closed").stream():
+        meeting_id = doc.to_dict().get("meeting_id", doc.id)
+        if str(meeting_id) == str(current):
+            continue
+        snapshot = db.collection("meeting_snapshots").document(doc.id).get()
+        if snapshot.exists and snapshot.to_dict().get("is_final"):
+            closed.append(meeting_id)
+    return closed
+
+
+def archive_records(db, archive, collections, months, page_size):
+    report = {}
+    cutoff = datetime.now(timezone.utc) - timedelta(days=30 * months) if months else None
+    meeting_ids = None
+
+    for collection in collections:
+        field, default_months = RETENTION_POLICY[collection]
+        moved = skipped = 0
+
+        if field is None:
+            if meeting_ids is None:
+                meeting_ids = closed_meeting_ids(db)
+            pages = (
+                page
+                for meeting_id in meeting_ids
+                for page in iter_query_pages(db.collection(collection).where("meeting_id", "==", meeting_id), page_size)
+            )
+        else:
+            collection_cutoff = cutoff or datetime.now(timezone.utc) - timedelta(days=30 * default_months)
+            pages = archive_candidates(db, collection, field, collection_cutoff, page_size)
+
+        for page in pages:
+            for doc in page:
+                if collection == "notices" and doc.to_dict().get("is_pinned"):
+                    skipped += 1
+                    continue
+                likes = list(doc.reference.collection("likes").stream()) if collection in ARCHIVE_WITH_LIKES else []
+                archive.move(collection, doc, likes)
+                moved += 1
+            archive.end_page()
+            print(f"{collection}: moved {moved}", flush=True)
+
+        report[collection] = {"moved": moved, "skipped": skipped}
+
+    archive.close()
+    return report
+
+
+def print_archive_report(report, dry_run):
+    verb = "would move" if dry_run else "moved"
+    print()
+    for collection, entry in report.items():
+        print(f"{collection:<28} {verb} {entry['moved']:>7}   kept (pinned) {entry['skipped']:>5}")
+
+
+# ---------------- CLI ----------------
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--credentials", help="service account JSON (default: application default credentials)")
+    parser.add_argument("--project", help="Google Cloud project id")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="chapter id (default: the root collections)")
+    parser.add_argument("--checkpoint", help="resume state file (default: jobs-checkpoint[-<tenant>].json)")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="documents per page")
+    jobs = parser.add_subparsers(dest="job", required=True)
+
+    migrate = jobs.add_parser("migrate-timestamps", help="convert legacy string timestamps to UTC timestamps")
+    migrate.add_argument("--source-tz", default=os.environ.get("APP_TZ", "UTC"),
+                         help="time zone the legacy strings were written in (default: $APP_TZ or UTC)")
+    migrate.add_argument("--dry-run", action="store_true", help="count conversions without writing")
+
+    recon = jobs.add_parser("reconcile", help="recompute denormalised counters and summaries, report drift")
+    recon.add_argument("--only", nargs="+", choices=RECONCILE_TARGETS, default=RECONCILE_TARGETS,
+                       help="subset of counters to reconcile")
+    recon.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="parallel reads per collection")
+    recon.add_argument("--dry-run", action="store_true", help="report drift without writing corrections")
+    recon.add_argument("--json", help="also write the drift report to this file")
+
+    trend = jobs.add_parser("recompute-trending", help="rebuild trend_score from creation and like times")
+    trend.add_argument("--source-tz", default=os.environ.get("APP_TZ", "UTC"),
+                       help="time zone of legacy string timestamps (default: $APP_TZ or UTC)")
+    trend.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="parallel likes reads")
+    trend.add_argument("--dry-run", action="store_true", help="count items without writing scores")
+
+    archive = jobs.add_parser("archive", help="move records past their retention period to the archive")
+    archive.add_argument("--only", nargs="+", choices=list(RETENTION_POLICY), default=list(RETENTION_POLICY),
+                         help="subset of collections to archive")
+    archive.add_argument("--months", type=int, help="override every collection's retention period")
+    archive.add_argument("--to", choices=["firestore", "jsonl"], default="firestore",
+                         help="archive_<collection> in Firestore, or gzipped JSONL files")
+    archive.add_argument("--archive-dir", default="archives", help="directory for --to jsonl")
+    archive.add_argument("--dry-run", action="store_true", help="count records without moving them")
+
+    args = parser.parse_args()
+    db = TenantClient(make_client(args.credentials, args.project), args.tenant)
+    if args.checkpoint is None:
+        suffix = "" if args.tenant == DEFAULT_TENANT else f"-{args.tenant}"
+        args.checkpoint = f"jobs-checkpoint{suffix}.json"
+
+    if args.job == "migrate-timestamps":
+        checkpoint = Checkpoint(args.checkpoint, args.job, enabled=not args.dry_run)
+        report = migrate_timestamps(db, checkpoint, ZoneInfo(args.source_tz), args.page_size, args.dry_run)
+        print_migration_report(report, args.dry_run)
+        if any(state.get("failed") for state in report.values()):
+            sys.exit(1)
+
+    elif args.job == "reconcile":
+        checkpoint = Checkpoint(args.checkpoint, args.job, enabled=not args.dry_run)
+        report = reconcile(db, checkpoint, args.only, args.page_size, args.workers, args.dry_run)
+        print_reconcile_report(report, args.dry_run)
+        if args.json:
+            with open(args.json, "w") as fh:
+                json.dump(report, fh, indent=2, default=str)
+        if any("error" in entry for entry in report.values()):
+            sys.exit(1)
+
+    elif args.job == "recompute-trending":
+        checkpoint = Checkpoint(args.checkpoint, args.job, enabled=not args.dry_run)
+        report = recompute_trending(db, checkpoint, ZoneInfo(args.source_tz), args.page_size, args.workers, args.dry_run)
+        print_trending_report(report, args.dry_run)
+
+    elif args.job == "archive":
+        if args.to == "jsonl":
+            target = JsonlArchive(db, args.archive_dir, args.dry_run)
+        else:
+            target = FirestoreArchive(db, args.dry_run)
+        report = archive_records(db, target, args.only, args.months, args.page_size)
+        print_archive_report(report, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""Concurrent-session load harness for the Volunteer Portal.
+
+Simulates N members using the app at the same time, the way a meeting-day
+spike looks: every virtual session logs in, reads the notice board, likes a
+notice, votes, submits attendance and opens the dashboard.
+
+Each session runs Streamlit's AppTest in its own worker process. AppTest keeps
+process-global state (the runtime singleton, the pages manager), so it cannot
+be shared between threads. This also means the sessions do not share
+st.cache_resource state the way sessions on one server do: every worker warms
+its own caches, so the Firestore load is higher than a real server's and
+cache-hit latencies are not represented.
+
+Runs against the Firestore emulator (there is no in-memory backend):
+
+    firebase emulators:start --only firestore
+    export FIRESTORE_EMULATOR_HOST=localhost:8080
+    python loadtest.py --sessions 50 --iterations 2
+
+Reports p50/p95/p99 latency per page and overall throughput. The CPU time
+and memory are for the worker processes, which run the app script and the
+harness together. They are not the figures of a `streamlit run` server.
+CPU time is summed over all workers. Memory is the peak of the workers'
+combined RSS when psutil is installed. Without psutil it is the largest
+single worker's peak RSS from getrusage.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from queue import Empty
+from datetime import datetime
+
+import bcrypt
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore
+from streamlit.testing.v1 import AppTest
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+LOAD_PASSWORD = "loadtest"
+FIRST_MOBILE = 9000000000
+BATCH_LIMIT = 400  # same headroom under Firestore's 500 writes per batch as app.py
+
+
+# ---------------- SEEDING ----------------
+
+def emulator_client():
+    if not os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        sys.exit("FIRESTORE_EMULATOR_HOST is not set; refusing to load-test a real project.")
+    return firestore.Client(
+        project=os.environ.get("GOOGLE_CLOUD_PROJECT", "volunteers-local"),
+        credentials=AnonymousCredentials()
+    )
+
+
+def seed(db, sessions, notices):
+    password_hash = bcrypt.hashpw(LOAD_PASSWORD.encode(), bcrypt.gensalt()).decode()
+    meeting_id = f"LOAD-{datetime.utcnow():%Y%m%d%H%M%S}"
+
+    writes = []
+    for i in range(sessions):
+        writes.append((db.collection("users").document(f"loadtest-{i}"), {
+            "name": f"load user {i}",
+            "father_name": "harness",
+            "mobile": str(FIRST_MOBILE + i),
+            "password_hash": password_hash,
+            "role": "User",
+            "is_approved": True,
+            "is_blocked": False,
+            "must_change_password": False,
+            "created_at": datetime.utcnow()
+        }))
+    for i in range(notices):
+        writes.append((db.collection("notices").document(f"loadtest-{i}"), {
+            "notice": f"Load test notice {i}",
+            "name_father": "harness / loadtest",
+            "posted_at": datetime.utcnow(),
+            "is_pinned": False,
+            "likes": 0,
+            "trend_score": 1.0
+        }))
+    writes.append((db.collection("admin_settings").document("meeting_options"), {
+        "meeting_id": meeting_id,
+        "agenda_options": ["Cleanup drive", "Blood camp", "Budget review"],
+        "date_options": ["Saturday", "Sunday"],
+        "time_options": ["10:00", "17:00"],
+        "place_options": ["Community hall", "School ground"],
+        "status": "Active",
+        "created_at": datetime.utcnow()
+    }))
+    writes.append((db.collection("meetings_history_list").document(meeting_id), {
+        "meeting_id": meeting_id,
+        "created_at": datetime.utcnow(),
+        "status": "Active",
+        "attendance_count": 0,
+        "vote_count": 0
+    }))
+
+    for start in range(0, len(writes), BATCH_LIMIT):
+        batch = db.batch()
+        for ref, data in writes[start:start + BATCH_LIMIT]:
+            batch.set(ref, data)
+        batch.commit()
+    return meeting_id
+
+
+# ---------------- SESSION SCRIPT ----------------
+
+def by_label(widgets, label):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"No widget labelled {label!r}")
+
+
+def navigate(at, page):
+    at.sidebar.radio[0].set_value(page)
+
+
+class VirtualMember:
+    def __init__(self, index, timeout, record):
+        self.mobile = str(FIRST_MOBILE + index)
+        self.timeout = timeout
+        self.record = record
+
+    def step(self, page, action):
+        started = time.perf_counter()
+        error = None
+        try:
+            at = action()
+            at.run(timeout=self.timeout)
+            if at.exception:
+                error = at.exception[0].message
+        except Exception as e:
+            error = str(e)
+        self.record(page, time.perf_counter() - started, error)
+
+    def run(self, iterations):
+        at = AppTest.from_file(APP_PATH, default_timeout=self.timeout)
+        self.step("Public Notice Board", lambda: at)
+
+        # Opening a page and submitting its form are timed as separate steps
+        def open_page(name):
+            def action():
+                navigate(at, name)
+                return at
+            return action
+
+        def login():
+            by_label(at.text_input, "Mobile Number").input(self.mobile)
+            by_label(at.text_input, "Password").input(LOAD_PASSWORD)
+            by_label(at.button, "Login").click()
+            return at
+
+        self.step("Login page", open_page("Login"))
+        self.step("Login submit", login)
+
+        for _ in range(iterations):
+            def like():
+                like_buttons = [b for b in at.button if b.label == "🤍 Like"]
+                if like_buttons:
+                    random.choice(like_buttons).click()
+                return at
+
+            def vote():
+                by_label(at.button, "Submit Vote").click()
+                return at
+
+            def attendance():
+                by_label(at.button, "Submit Attendance").click()
+                return at
+
+            self.step("Public Notice Board", open_page("Public Notice Board"))
+            self.step("Like", like)
+            self.step("Plan Next Meeting", open_page("Plan Next Meeting"))
+            self.step("Vote submit", vote)
+            self.step("Meetings", open_page("Meetings"))
+            self.step("Attendance submit", attendance)
+            self.step("Dashboard", open_page("Dashboard"))
+
+
+def run_member(index, iterations, timeout, results):
+    # Worker process entry point: one session, its samples sent back on the
+    # queue and a final None once it is done
+    def record(page, seconds, error):
+        results.put((page, seconds, error))
+
+    try:
+        VirtualMember(index, timeout, record).run(iterations)
+    except Exception as e:
+        record("Session", None, str(e))
+    finally:
+        results.put(None)
+
+
+# ---------------- REPORTING ----------------
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def __call__(self, page, seconds, error):
+        # seconds is None for a session that failed outside a timed step
+        with self._lock:
+            if seconds is not None:
+                self.latencies.setdefault(page, []).append(seconds)
+            if error:
+                self.errors.setdefault(page, []).append(error)
+
+
+class ProcessSampler(threading.Thread):
+    # Samples the combined RSS of the worker processes while the load runs (psutil only)
+    def __init__(self, interval=0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.rss = []
+        self._halt = threading.Event()
+
+    def run(self):
+        if psutil is None:
+            return
+        proc = psutil.Process()
+        while not self._halt.is_set():
+            total = 0
+            for child in proc.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    pass  # exited between listing and sampling
+            self.rss.append(total)
+            self._halt.wait(self.interval)
+
+    def stop(self):
+        self._halt.set()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def build_report(recorder, wall_seconds, cpu_seconds, sampler, sessions):
+    pages = []
+    for page, values in sorted(recorder.latencies.items()):
+        pages.append({
+            "page": page,
+            "requests": len(values),
+            "errors": len(recorder.errors.get(page, [])),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+            "mean_ms": round(statistics.mean(values) * 1000, 1),
+        })
+
+    total = sum(p["requests"] for p in pages)
+    peak_rss_mb = (
+        max(sampler.rss) / 2 ** 20 if sampler.rss
+        else resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024  # KB on Linux, largest worker
+    )
+    return {
+        "sessions": sessions,
+        "wall_seconds": round(wall_seconds, 2),
+        "throughput_rps": round(total / wall_seconds, 2) if wall_seconds else 0.0,
+        "cpu_seconds": round(cpu_seconds, 2),
+        "cpu_utilisation": round(cpu_seconds / wall_seconds, 2) if wall_seconds else 0.0,
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "pages": pages,
+        "sample_errors": {page: errs[:3] for page, errs in recorder.errors.items()},
+    }
+
+
+def print_report(report):
+    print(f"\nSessions: {report['sessions']}   wall: {report['wall_seconds']}s   "
+          f"throughput: {report['throughput_rps']} page runs/s")
+    print(f"Workers' CPU: {report['cpu_seconds']}s ({report['cpu_utilisation']} cores avg)   "
+          f"peak RSS: {report['peak_rss_mb']} MB\n")
+    header = f"{'Page':<22}{'Req':>6}{'Err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for p in report["pages"]:
+        print(f"{p['page']:<22}{p['requests']:>6}{p['errors']:>6}"
+              f"{p['p50_ms']:>10}{p['p95_ms']:>10}{p['p99_ms']:>10}")
+    for page, errs in report["sample_errors"].items():
+        print(f"\n{page} errors (first {len(errs)}):")
+        for err in errs:
+            print(f"  {err}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent virtual members, one process each")
+    parser.add_argument("--iterations", type=int, default=1, help="page loops per member after login")
+    parser.add_argument("--notices", type=int, default=30, help="notices to seed")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which sessions start")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per script run timeout (s)")
+    parser.add_argument("--no-seed", action="store_true", help="reuse previously seeded data")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    db = emulator_client()
+    if not args.no_seed:
+        meeting_id = seed(db, args.sessions, args.notices)
+        print(f"Seeded {args.sessions} users, {args.notices} notices, meeting {meeting_id}")
+
+    recorder = Recorder()
+    sampler = ProcessSampler()
+    # Spawned, not forked: each worker starts with a clean Streamlit runtime
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [
+        context.Process(target=run_member, args=(i, args.iterations, args.timeout, results), name=f"member-{i}")
+        for i in range(args.sessions)
+    ]
+
+    cpu_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    sampler.start()
+
+    for worker in workers:
+        worker.start()
+        time.sleep(args.ramp / max(1, args.sessions))
+
+    # Drain while the workers run, so none blocks on a full queue
+    finished = 0
+    while finished < len(workers):
+        try:
+            sample = results.get(timeout=1.0)
+        except Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break  # a worker died without reporting
+            continue
+        if sample is None:
+            finished += 1
+        else:
+            recorder(*sample)
+    for worker in workers:
+        worker.join()
+
+    wall = time.perf_counter() - started
+    sampler.stop()
+    cpu_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_seconds = (cpu_after.ru_utime - cpu_before.ru_utime) + (cpu_after.ru_stime - cpu_before.ru_stime)
+
+    report = build_report(recorder, wall, cpu_seconds, sampler, args.sessions)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()